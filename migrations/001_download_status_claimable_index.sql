@@ -0,0 +1,12 @@
+-- Partial index covering exactly the rows DatabaseHandler.get_next_documents() can claim.
+-- The claim query orders by id, so SKIP LOCKED walks only eligible index entries
+-- instead of scanning and discarding the whole table.
+--
+-- CONCURRENTLY cannot run inside a transaction block: run with autocommit, e.g.
+--   psql "$DATABASE_URL" -f migrations/001_download_status_claimable_index.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_download_status_claimable
+    ON download_status (id)
+    WHERE download_status = 'success'
+      AND (ocr_status = 'pending' OR ocr_status IS NULL)
+      AND s3_key IS NOT NULL
+      AND LENGTH(s3_key) > 0;
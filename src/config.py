@@ -1,24 +1,80 @@
 import os
-from dataclasses import dataclass
+from types import SimpleNamespace
 
-@dataclass
-class Config:
+
+def _bool(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+
+# (name, default, type) - every variable is read and coerced exactly once, at import
+_SPEC = [
     # Database
-    DB_HOST = os.getenv('DB_HOST')
-    DB_PORT = int(os.getenv('DB_PORT', 5432))
-    DB_NAME = os.getenv('DB_NAME')
-    DB_USER = os.getenv('DB_USER')
-    DB_PASSWORD = os.getenv('DB_PASSWORD')
+    ('DB_HOST', None, str),
+    ('DB_PORT', 5432, int),
+    ('DB_NAME', None, str),
+    ('DB_USER', None, str),
+    ('DB_PASSWORD', None, str),
+    ('DB_POOL_MAX_CONN', None, int),  # Defaults to 2 x WORKERS_PER_CONTAINER
+    ('DB_USE_PREPARED', '0', _bool),  # Not with PgBouncer transaction pooling
 
     # S3
-    S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
-    S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
-    S3_REGION = os.getenv('S3_REGION', 'eu-west-1')
-    S3_BUCKET = os.getenv('S3_BUCKET', 'my-invoice-files')
+    ('S3_ACCESS_KEY', None, str),
+    ('S3_SECRET_KEY', None, str),
+    ('S3_REGION', 'eu-west-1', str),
+    ('S3_BUCKET', 'my-invoice-files', str),
 
     # Worker
-    WORKERS_PER_CONTAINER = int(os.getenv('WORKERS_PER_CONTAINER', 5))
-    GPU_DEVICE = os.getenv('GPU_DEVICE', 'cpu')  # Use 'cpu' or 'gpu' (no number needed for PPStructureV3)
+    ('WORKERS_PER_CONTAINER', 5, int),
+    ('GPU_DEVICE', 'cpu', str),  # Use 'cpu' or 'gpu' (no number needed for PPStructureV3)
+    ('PDF_DPI', 120, int),  # Rasterization DPI; mobile OCR models read standard-size text fine at 120
+    ('PDF_RETRY_DPI', 200, int),  # Re-OCR pages at this DPI when recognition is poor
+    ('PDF_RETRY_MIN_SCORE', 0.7, float),  # Median recognition score below which a page is retried
+    ('EXTRACTION_PROCESSES', None, int),  # Table extraction pool size per worker; 0/1 = in-process, None = the worker's cores
+    ('BLANK_PAGE_MAX_INK', 0.000005, float),  # Pages with at most this fraction of dark pixels skip OCR (~7px on A4 at 120 DPI); 0 = OCR all
+    ('OCR_REC_BATCH_NUM', 1, int),  # Text crops recognized per predictor run; oneDNN arenas scale with it, CPU gains nothing from more
+    ('OCR_THREADS', 1, int),  # Pages OCR'd concurrently per worker, one predictor each; the worker's cores are split between them
+    ('OCR_WARMUP', '1', _bool),  # Run OCR once on a synthetic page at worker start
+    ('OCR_ONNX_DIR', None, str),  # Directory with det.onnx/rec.onnx to run OCR on ONNX Runtime; None = Paddle Inference
+    ('OCR_ONNX_REC_MODEL', 'rec.onnx', str),  # Recognizer file in OCR_ONNX_DIR, e.g. an INT8 rec_int8.onnx
+    ('PREFETCH_DOCUMENT', '1', _bool),  # Direct-claim workers: take and download the next document while the current one is processed
+    ('TMP_DIR', None, str),  # Scratch dir for downloaded PDFs; None = system temp dir
 
     # Output format
-    OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'clean')  # 'clean' or 'verbose'
\ No newline at end of file
+    ('OUTPUT_FORMAT', 'clean', str),  # 'clean' or 'verbose'
+]
+
+
+def _coerce(value, cast):
+    if value is None:
+        return None
+    return cast(value)
+
+
+def _dsn_value(value):
+    """Quote a value for a libpq key=value connection string"""
+    value = str(value).replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{value}'"
+
+
+def _build_dsn(cfg):
+    params = {
+        'host': cfg.DB_HOST,
+        'port': cfg.DB_PORT,
+        'dbname': cfg.DB_NAME,
+        'user': cfg.DB_USER,
+        'password': cfg.DB_PASSWORD,
+    }
+    return ' '.join(f"{key}={_dsn_value(value)}" for key, value in params.items() if value is not None)
+
+
+Config = SimpleNamespace(**{
+    name: _coerce(os.environ.get(name, default), cast) for name, default, cast in _SPEC
+})
+
+if Config.DB_POOL_MAX_CONN is None:
+    Config.DB_POOL_MAX_CONN = Config.WORKERS_PER_CONTAINER * 2
+
+Config.OCR_THREADS = max(1, Config.OCR_THREADS)
+
+# Pre-built libpq DSN so (re)connects don't rebuild it from individual settings
+Config.DB_DSN = _build_dsn(Config)
@@ -1,94 +1,308 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import logging
-from datetime import datetime
+import time
+import threading
+import queue
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from config import Config
 
+# Claim query shared by the plain and PREPAREd paths; placeholders are filled per driver syntax
+_CLAIM_SQL = """
+    WITH claimable AS (
+        SELECT id
+        FROM download_status
+        WHERE download_status = 'success'
+        AND (ocr_status = 'pending' OR ocr_status IS NULL)
+        AND s3_key IS NOT NULL
+        AND LENGTH(s3_key) > 0
+        ORDER BY id
+        LIMIT {limit}
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE download_status d
+    SET ocr_status = 'processing',
+        ocr_worker_id = {worker_id},
+        ocr_started_at = NOW()
+    FROM claimable
+    WHERE d.id = claimable.id
+    RETURNING d.id, d.siren, d.s3_key
+"""
+
+
+class _Connection(psycopg2.extensions.connection):
+    """Pooled connection that remembers whether its session already has the prepared statements"""
+    prepared = False
+
+
+# One pool per process, created lazily so forked workers never share sockets
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadedConnectionPool(
+                minconn=1,
+                maxconn=Config.DB_POOL_MAX_CONN,
+                dsn=Config.DB_DSN,
+                connection_factory=_Connection
+            )
+    return _POOL
+
+
+class CompletionWriter:
+    """
+    Single writer thread for status updates: mark_completed/mark_failed only enqueue, and this thread
+    drains the queue into batched UPDATEs so workers never wait on (or contend for) the write path.
+    """
+
+    def __init__(self, handler, max_batch=256, interval=0.2, max_attempts=5, max_backoff=30, put_timeout=5):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.interval = interval  # Seconds to keep gathering rows after the first one arrives
+        self.max_attempts = max_attempts  # Failed writes of a row before it is dropped
+        self.max_backoff = max_backoff  # Upper bound, in seconds, of the delay between retries
+        self.put_timeout = put_timeout  # Seconds put() waits on a full queue before writing directly
+        self.q = queue.Queue(maxsize=1000)
+        # Rows taken off the queue but not yet committed, and how many are still outstanding overall
+        self._done = []
+        self._failed = []
+        self._unwritten = 0
+        self._attempts = 0  # Consecutive failed flushes of the pending rows
+        self._idle = threading.Condition()
+        self._thread = threading.Thread(target=self.run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, kind, row):
+        with self._idle:
+            self._unwritten += 1
+        try:
+            self.q.put((kind, row), timeout=self.put_timeout)
+        except queue.Full:
+            # The writer is stuck retrying: write this row from the caller rather than stall the worker
+            logging.error(f"Database writer: queue full, writing status for doc_id {row[0]} directly")
+            done, failed = ([row], []) if kind == 'done' else ([], [row])
+            if not self.handler.write_statuses(done, failed):
+                logging.error(f"Database writer: dropped status update for doc_id {row[0]}")
+            self._written(1)
+
+    def run(self):
+        while True:
+            # Block for the first row (or retry pending rows after a failed write, backing off), then gather a batch
+            try:
+                self._take(self.q.get(timeout=self._retry_delay() if (self._done or self._failed) else None))
+            except queue.Empty:
+                pass
+            deadline = time.monotonic() + self.interval
+            while len(self._done) + len(self._failed) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._take(self.q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush()
+
+    def _retry_delay(self):
+        """Exponential backoff between attempts to write rows that failed"""
+        return min(self.interval * 2 ** self._attempts, self.max_backoff)
+
+    def _take(self, item):
+        kind, row = item
+        (self._done if kind == 'done' else self._failed).append(row)
+
+    def _flush(self):
+        pending = len(self._done) + len(self._failed)
+        if self.handler.write_statuses(self._done, self._failed):
+            self._done, self._failed = [], []
+            self._attempts = 0
+            self._written(pending)
+            return
+
+        # Write the batch row by row so one bad row (constraint violation, NUL byte...) does not hold back
+        # the others; rows that keep failing are dropped after max_attempts flushes
+        self._done = [row for row in self._done if not self.handler.write_statuses([row], [])]
+        self._failed = [row for row in self._failed if not self.handler.write_statuses([], [row])]
+        self._attempts = self._attempts + 1 if (self._done or self._failed) else 0
+        if self._attempts >= self.max_attempts:
+            doc_ids = [row[0] for row in self._done + self._failed]
+            logging.error(f"Database writer: dropping status updates for doc_ids {doc_ids} after {self._attempts} attempts")
+            self._done, self._failed = [], []
+            self._attempts = 0
+        self._written(pending - len(self._done) - len(self._failed))
+
+    def _written(self, count):
+        """Account for count rows that left the writer, committed or dropped"""
+        if count:
+            with self._idle:
+                self._unwritten -= count
+                self._idle.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every queued row is committed; returns False if timeout expired first"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unwritten == 0, timeout)
+
+
 class DatabaseHandler:
-    def __init__(self):
-        self.conn = None
+    """Claims documents and records their OCR status. Safe to share between threads of one process."""
+
+    def __init__(self, batch_size=None, worker_id=None):
+        self.pool = None
+        # Worker process recorded in ocr_worker_id with each status update (claims made by the
+        # dispatcher in main.py only carry the container prefix)
+        self.worker_id = worker_id
+        # Documents claimed in one trip but not yet handed out to the worker
+        self.batch_size = batch_size or max(4, Config.WORKERS_PER_CONTAINER)
+        self._claimed = deque()
+        # Guards the claim queue; connections come from the thread-safe pool
+        self._lock = threading.Lock()
         self.connect()
+        # Status updates are written in the background by a single writer thread
+        self.writer = CompletionWriter(self)
 
     def connect(self):
-        self.conn = psycopg2.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            database=Config.DB_NAME,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD
-        )
-        self.conn.autocommit = False
+        self.pool = get_pool()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection, rolling back on error and returning it afterwards"""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
 
     def get_next_document(self, worker_id):
+        """Return the next claimed document, claiming a new batch when the local queue is empty"""
+        with self._lock:
+            if self._claimed:
+                return self._claimed.popleft()
+
+        docs = self.get_next_documents(worker_id, self.batch_size)
+
+        with self._lock:
+            self._claimed.extend(docs)
+            return self._claimed.popleft() if self._claimed else None
+
+    def get_next_documents(self, worker_id, batch_size):
+        """Atomically claim up to batch_size pending documents in a single round-trip"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT id, siren, s3_key
-                    FROM download_status
-                    WHERE download_status = 'success'
-                    AND (ocr_status = 'pending' OR ocr_status IS NULL)
-                    AND s3_key IS NOT NULL
-                    AND LENGTH(s3_key) > 0
-                    LIMIT 1
-                    FOR UPDATE SKIP LOCKED
-                """)
-                doc = cur.fetchone()
-
-                if doc:
-                    cur.execute("""
-                        UPDATE download_status
-                        SET ocr_status = 'processing',
-                            ocr_worker_id = %s,
-                            ocr_started_at = NOW()
-                        WHERE id = %s
-                    """, (worker_id, doc['id']))
-                    self.conn.commit()
-
-                return doc
+            with self.connection() as conn:
+                # The claim is one statement, so run it in autocommit: no separate BEGIN/COMMIT trips
+                conn.autocommit = True
+                try:
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        if Config.DB_USE_PREPARED:
+                            self._prepare_statements(conn)
+                            cur.execute("EXECUTE claim_documents (%s, %s)", (batch_size, worker_id))
+                        else:
+                            cur.execute(_CLAIM_SQL.format(limit='%s', worker_id='%s'), (batch_size, worker_id))
+                        return cur.fetchall()
+                finally:
+                    if not conn.closed:
+                        conn.autocommit = False
         except Exception as e:
-            self.conn.rollback()
             logging.error(f"Database error: {e}")
-            return None
+            return []
+
+    def _prepare_statements(self, conn):
+        """PREPARE the claim query once per pooled connection (runs in the claim's autocommit; not PgBouncer-transaction safe)"""
+        if conn.prepared:
+            return
+        with conn.cursor() as cur:
+            cur.execute("PREPARE claim_documents (int, text) AS " + _CLAIM_SQL.format(limit='$1', worker_id='$2'))
+        conn.prepared = True
+
+    def mark_completed(self, doc_id, text_key, json_key, processing_time_ms, num_pages, text_length):
+        """Queue a completion for the writer thread. The text and JSON object keys go in ocr_s3_path and
+        ocr_text_file_path; readers build URLs with s3_handler.s3_url."""
+        self.writer.put('done', (doc_id, processing_time_ms, text_key, json_key, text_length,
+                                 datetime.now(timezone.utc), self.worker_id))
+
+    def release_claimed(self):
+        """Release the documents claimed by get_next_document but not handed out yet (on shutdown)"""
+        with self._lock:
+            doc_ids = [doc['id'] for doc in self._claimed]
+            self._claimed.clear()
+        self.release_documents(doc_ids)
 
-    def mark_completed(self, doc_id, text_s3_url, json_s3_url, processing_time_ms, num_pages, text_length):
-        """Mark completed with text file in ocr_s3_path and JSON in ocr_text_file_path"""
+    def release_documents(self, doc_ids):
+        """Hand claimed documents that will not be processed back to the pending pool (written immediately)"""
+        if not doc_ids:
+            return
         try:
-            with self.conn.cursor() as cur:
+            with self.connection() as conn, conn.cursor() as cur:
                 cur.execute("""
                     UPDATE download_status
-                    SET ocr_status = 'completed',
-                        ocr_completed_at = NOW(),
-                        ocr_processing_time_ms = %s,
-                        ocr_s3_path = %s,
-                        ocr_text_file_path = %s,
-                        ocr_text_length = %s,
-                        ocr_engine = 'PaddleOCR-v2'
-                    WHERE id = %s
-                """, (processing_time_ms, text_s3_url, json_s3_url, text_length, doc_id))
-                self.conn.commit()
+                    SET ocr_status = 'pending',
+                        ocr_worker_id = NULL,
+                        ocr_started_at = NULL
+                    WHERE id = ANY(%s) AND ocr_status = 'processing'
+                """, (list(doc_ids),))
+                conn.commit()
+            logging.info(f"Released claimed documents {list(doc_ids)}")
         except Exception as e:
-            self.conn.rollback()
-            import traceback
-            logging.error(f"Database update error for doc_id {doc_id}: {e}")
-            logging.error(f"Full traceback: {traceback.format_exc()}")
-            raise
+            logging.error(f"Database error releasing doc_ids {list(doc_ids)}: {e}")
 
     # REMOVED - Using single mark_completed method that stores JSON in ocr_text_file_path
 
     def mark_failed(self, doc_id, error_message):
+        """Queue a failure for the writer thread"""
+        self.writer.put('failed', (doc_id, error_message[:500], datetime.now(timezone.utc), self.worker_id))
+
+    def flush_completed(self, timeout=30):
+        """Wait until the writer thread has committed every queued status update"""
+        if not self.writer.wait(timeout):
+            logging.error(f"Database writer: status updates still pending after {timeout}s")
+
+    def write_statuses(self, done, failed):
+        """Write completions and failures with one batched UPDATE each and a single commit"""
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE download_status
-                    SET ocr_status = 'failed',
-                        ocr_completed_at = NOW(),
-                        ocr_processing_time_ms = EXTRACT(EPOCH FROM (NOW() - ocr_started_at)) * 1000,
-                        ocr_error = %s
-                    WHERE id = %s
-                """, (error_message[:500], doc_id))
-                self.conn.commit()
+            with self.connection() as conn, conn.cursor() as cur:
+                if done:
+                    execute_values(cur, """
+                        UPDATE download_status
+                        SET ocr_status = 'completed',
+                            ocr_completed_at = v.completed_at,
+                            ocr_processing_time_ms = v.processing_time_ms,
+                            ocr_s3_path = v.text_key,
+                            ocr_text_file_path = v.json_key,
+                            ocr_text_length = v.text_length,
+                            ocr_engine = 'PaddleOCR-v2',
+                            ocr_worker_id = COALESCE(v.worker_id, download_status.ocr_worker_id)
+                        FROM (VALUES %s) AS v(id, processing_time_ms, text_key, json_key, text_length, completed_at, worker_id)
+                        WHERE download_status.id = v.id
+                    """, done, page_size=len(done))
+                if failed:
+                    execute_values(cur, """
+                        UPDATE download_status
+                        SET ocr_status = 'failed',
+                            ocr_completed_at = v.failed_at,
+                            ocr_processing_time_ms = EXTRACT(EPOCH FROM (v.failed_at - ocr_started_at)) * 1000,
+                            ocr_error = v.error,
+                            ocr_worker_id = COALESCE(v.worker_id, download_status.ocr_worker_id)
+                        FROM (VALUES %s) AS v(id, error, failed_at, worker_id)
+                        WHERE download_status.id = v.id
+                    """, failed, page_size=len(failed))
+                conn.commit()
+            return True
         except Exception as e:
-            self.conn.rollback()
             import traceback
-            logging.error(f"Database error marking failed for doc_id {doc_id}: {e}")
-            logging.error(f"Full traceback: {traceback.format_exc()}")
\ No newline at end of file
+            doc_ids = [row[0] for row in done + failed]
+            logging.error(f"Database error writing status for doc_ids {doc_ids}: {e}")
+            logging.error(f"Full traceback: {traceback.format_exc()}")
+            return False
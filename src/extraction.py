@@ -1,60 +1,202 @@
 #!/usr/bin/env python3
 """Table extraction module for OCR results"""
 
+import io
 import logging
-from typing import List, Dict, Any
+import re
+from html import escape
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the NumPy kernels below are used without it
+    njit = None
 
 logger = logging.getLogger('TableExtractor')
 
+# Translation tables for counting character classes in C: len(s) - len(s.translate(table))
+_DEL_DIGITS = str.maketrans('', '', '0123456789')
+# Opening and closing cell tags, indexed by whether the row is a header
+_CELL_TAGS = (("<td>", "</td>"), ("<th>", "</th>"))
+
+# Letters only (word characters minus digits and underscore)
+_ALPHA_RE = re.compile(r'[^\W\d_]')
+
+# Render resolution the pixel thresholds of TableExtractor (row/gap/column tolerances, header window)
+# are tuned for; boxes from pages rendered at any other DPI are scaled to it first (see scale_to_reference)
+REFERENCE_DPI = 150
+
+
+def _split_points_numpy(values: np.ndarray, threshold: float) -> np.ndarray:
+    """Indices i where values[i] - values[i-1] > threshold, i.e. where a new group starts."""
+    return np.flatnonzero(np.diff(values) > threshold) + 1
+
+
+def _distance_to_nearest(boundaries: np.ndarray, xs: np.ndarray) -> np.ndarray:
+    """Distance from each x to the closest of the sorted boundaries, by binary search."""
+    if not len(boundaries):
+        return np.full(len(xs), np.inf)
+    pos = np.searchsorted(boundaries, xs)
+    left = boundaries[np.maximum(pos - 1, 0)]
+    right = boundaries[np.minimum(pos, len(boundaries) - 1)]
+    return np.minimum(np.abs(xs - left), np.abs(xs - right))
+
+
+def _nearest_index(boundaries: np.ndarray, xs: np.ndarray) -> np.ndarray:
+    """Index of the closest of the sorted boundaries for each x (the lower one on ties)."""
+    pos = np.searchsorted(boundaries, xs)
+    left = np.maximum(pos - 1, 0)
+    right = np.minimum(pos, len(boundaries) - 1)
+    return np.where(np.abs(xs - boundaries[right]) < np.abs(xs - boundaries[left]), right, left)
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _split_points(values, threshold):
+        # Single pass without the NumPy temporaries; same result as _split_points_numpy
+        out = np.empty(len(values), dtype=np.int64)
+        n = 0
+        for i in range(1, len(values)):
+            if values[i] - values[i - 1] > threshold:
+                out[n] = i
+                n += 1
+        return out[:n]
+else:
+    _split_points = _split_points_numpy
+
+
+def bbox_array(bboxes: List, dtype=np.float64) -> np.ndarray:
+    """Corners of a page's block bounding boxes (lists or arrays of points) as one (n, 4, 2) array."""
+    if not len(bboxes):
+        return np.empty((0, 4, 2), dtype=dtype)
+    try:
+        return np.asarray(bboxes, dtype=dtype)
+    except ValueError:
+        # Ragged polygons: keep only the corners the extractor reads (top-left, bottom-right)
+        corners = np.zeros((len(bboxes), 4, 2), dtype=dtype)
+        corners[:, 0] = [bbox[0] for bbox in bboxes]
+        corners[:, 2] = [bbox[2] for bbox in bboxes]
+        return corners
+
+
+def scale_to_reference(boxes: np.ndarray, dpi: float) -> np.ndarray:
+    """Box coordinates of a page rendered at dpi, in REFERENCE_DPI pixels (same dtype)."""
+    boxes = np.asarray(boxes)
+    if dpi == REFERENCE_DPI:
+        return boxes
+    return (boxes * (REFERENCE_DPI / dpi)).astype(boxes.dtype, copy=False)
+
+
+class PageIndex:
+    """
+    Struct-of-arrays view over the text blocks of one page, built once per page.
+    Rows and tables are passed between helpers as arrays of block indices into it.
+    """
+
+    def __init__(self, text: List[str], corners: np.ndarray):
+        n = len(text)
+        self.text = text
+        corners = np.asarray(corners, dtype=np.float64)
+        # Left edge X and vertical midpoint Y of each block, from its (n, corners, 2) corner array
+        self.X = corners[:, 0, 0]
+        self.Y = (corners[:, 0, 1] + corners[:, 2, 1]) * 0.5
+        # Whether each block contains a digit, classified once per page
+        self.has_digit = np.fromiter((len(t.translate(_DEL_DIGITS)) != len(t) for t in self.text),
+                                     dtype=bool, count=n)
+        # Row number of each block, filled in by TableExtractor._group_into_rows
+        self.row_of = np.full(n, -1, dtype=np.int32)
+        # Whether each block reads as header text (date, year or keyword); filled on first use
+        # by TableExtractor._construct_header_from_aligned_text and shared by all tables of the page
+        self.is_header_text: Optional[np.ndarray] = None
+        # Per-row data, computed once per page: the rows themselves, their Y position
+        # (midpoint of their leftmost block), whether any block has a digit and their header classification
+        self.rows: List[np.ndarray] = []
+        self.row_y = np.empty(0, dtype=np.float64)
+        self.row_has_digit = np.empty(0, dtype=bool)
+        self.row_is_header = np.empty(0, dtype=bool)
+
+    @classmethod
+    def from_blocks(cls, text_blocks: List[Dict]) -> 'PageIndex':
+        """Build the index from OCR text block dicts ({'text', 'bbox'})."""
+        return cls([b['text'] for b in text_blocks], bbox_array([b['bbox'] for b in text_blocks]))
+
 
 class TableExtractor:
     """Extract tables from OCR text blocks using coordinate analysis"""
 
+    # Dates, years and header keywords that mark text above a table as a column header,
+    # compiled into one alternation so each block is scanned once
+    _HEADER_TEXT_RE = re.compile('|'.join([
+        r'\d{1,2}/\d{1,2}/\d{4}',  # DD/MM/YYYY or MM/DD/YYYY
+        r'\d{1,2}/\d{1,2}/\d{2}',   # DD/MM/YY
+        r'\d{1,2}/\d{4}',            # MM/YYYY
+        r'\d{1,2}-\d{1,2}-\d{4}',   # DD-MM-YYYY
+        r'\d{1,2}-\d{1,2}-\d{2}',    # DD-MM-YY
+        r'\d{4}',                    # YYYY (year only)
+        r'exercice\s+n(?:-\d)?',    # Exercice N, Exercice N-1
+        r'n-\d',                     # N-1, N-2 etc
+        # Common header keywords
+        'brut', 'net', 'amortissement', 'depreciation', 'total', 'montant',
+    ]), re.IGNORECASE)
+
+    # Header keywords for _is_header_row, matched as substrings of the lowercased row text in one scan
+    _HEADER_KEYWORD_RE = re.compile('|'.join(map(re.escape, [
+        'actif', 'passif', 'total', 'brut', 'amortissement', 'amort',
+        'net', 'exercice', 'capital', 'reserves', 'resultat',
+        'charges', 'produits', 'exploitation', 'financier',
+        'montant', 'date', 'libelle', 'compte', 'deprec',
+        'n-1', 'n+1', '2023', '2022', '2024', '2021'
+    ])))
+
+    # Year (e.g. 2023) and full date (e.g. 31/12/2023) patterns used by _is_header_row
+    _YEAR_RE = re.compile(r'\b(19|20)\d{2}\b')
+    _DATE_RE = re.compile(r'\d{1,2}/\d{1,2}/\d{4}')
+
     def __init__(self, worker_id: str = ""):
         self.worker_id = worker_id
 
-    def _find_matching_header(self, header_rows: List[List[Dict]], table: List[List[Dict]],
-                             column_boundaries: List[float], all_rows: List[List[Dict]]) -> List[Dict]:
+    def _find_matching_header(self, page: PageIndex, header_rows: List[np.ndarray], header_row_nums: List[int],
+                             table: List[np.ndarray], column_boundaries: List[float],
+                             all_rows: List[np.ndarray]) -> Optional[np.ndarray]:
         """
         Find a header row that matches the column structure of the given table.
         Headers should appear before the table (lower Y coordinate) and have similar column alignment.
         If no explicit header is found, create one from aligned text above columns.
+        header_row_nums holds the page row number of each header row.
         """
         if not table:
             return None
 
         # Get Y position of first table row
-        table_y = (table[0][0]['bbox'][0][1] + table[0][0]['bbox'][2][1]) / 2 if table[0] else float('inf')
+        table_y = page.Y[table[0][0]] if len(table[0]) else float('inf')
 
         best_header = None
         best_score = 0
+        boundaries = np.asarray(column_boundaries, dtype=np.float64)
 
-        # First try to find explicit header rows
-        for header in header_rows:
-            if not header:
-                continue
+        # First try to find explicit header rows; their Y positions come from the per-row table
+        header_ys = page.row_y[header_row_nums]
+
+        # Header should be above the table
+        above = np.flatnonzero(header_ys < table_y)
+
+        # Also consider proximity (closer headers are better)
+        proximity = 1.0 / (1 + (table_y - header_ys[above]) / 100)  # Decay with distance
 
-            # Header should be above the table
-            header_y = (header[0]['bbox'][0][1] + header[0]['bbox'][2][1]) / 2
-            if header_y >= table_y:
+        for h, proximity_bonus in zip(above.tolist(), proximity):
+            header = header_rows[h]
+
+            # Alignment score is at most 1, so this header cannot beat the current best
+            if proximity_bonus <= best_score:
                 continue
 
-            # Check if header aligns with column boundaries
-            alignment_score = 0
-            for block in header:
-                block_x = block['bbox'][0][0]
-                # Check if block aligns with any column boundary
-                for boundary in column_boundaries:
-                    if abs(block_x - boundary) < 40:  # 40px tolerance for alignment
-                        alignment_score += 1
-                        break
+            # Check if header blocks align with their nearest column boundary
+            aligned = np.count_nonzero(_distance_to_nearest(boundaries, page.X[header]) < 40)  # 40px tolerance
 
             # Normalize score by number of blocks
-            if len(header) > 0:
-                alignment_score = alignment_score / len(header)
-
-            # Also consider proximity (closer headers are better)
-            proximity_bonus = 1.0 / (1 + (table_y - header_y) / 100)  # Decay with distance
+            alignment_score = aligned / len(header)
 
             total_score = alignment_score * proximity_bonus
 
@@ -63,12 +205,12 @@ class TableExtractor:
                 best_header = header
 
         # If we found a good header, return it
-        if best_header and best_score > 0.3:
+        if best_header is not None and best_score > 0.3:
             return best_header
 
         # Otherwise, try to construct a header from text/dates aligned with columns
         constructed_header = self._construct_header_from_aligned_text(
-            all_rows, table, column_boundaries, table_y
+            page, all_rows, table, column_boundaries, table_y
         )
 
         return constructed_header
@@ -87,226 +229,189 @@ class TableExtractor:
 
         return True
 
-    def _construct_header_from_aligned_text(self, all_rows: List[List[Dict]], table: List[List[Dict]],
-                                           column_boundaries: List[float], table_y: float) -> List[Dict]:
+    def _construct_header_from_aligned_text(self, page: PageIndex, all_rows: List[np.ndarray],
+                                           table: List[np.ndarray], column_boundaries: List[float],
+                                           table_y: float) -> Optional[np.ndarray]:
         """
         Construct a header row from text/dates that align with column positions.
         Look for text or date patterns above the table that align with columns.
         """
-        import re
-
-        # Date patterns to look for
-        date_patterns = [
-            r'\d{1,2}/\d{1,2}/\d{4}',  # DD/MM/YYYY or MM/DD/YYYY
-            r'\d{1,2}/\d{1,2}/\d{2}',   # DD/MM/YY
-            r'\d{1,2}/\d{4}',            # MM/YYYY
-            r'\d{1,2}-\d{1,2}-\d{4}',   # DD-MM-YYYY
-            r'\d{1,2}-\d{1,2}-\d{2}',    # DD-MM-YY
-            r'\d{4}',                    # YYYY (year only)
-            r'exercice\s+n(?:-\d)?',    # Exercice N, Exercice N-1
-            r'n-\d',                     # N-1, N-2 etc
-        ]
-
-        # Common header keywords
-        header_keywords = ['brut', 'net', 'amortissement', 'depreciation', 'total', 'montant']
-
         header_blocks = []
 
-        # Look through rows above the table
-        for row in all_rows:
-            if not row:
-                continue
-
-            row_y = (row[0]['bbox'][0][1] + row[0]['bbox'][2][1]) / 2
+        # Look through rows above the table, skipping rows that are below or part of the
+        # table or too far above it (more than 200px)
+        row_y = page.row_y
+        nearby = np.flatnonzero((row_y < table_y) & (table_y - row_y <= 200))
 
-            # Skip if row is below or part of the table
-            if row_y >= table_y:
-                continue
-
-            # Skip if too far above (more than 200px)
-            if table_y - row_y > 200:
-                continue
+        # Check if each block's text is a date, year, or header keyword (single scan per block and page)
+        if page.is_header_text is None:
+            page.is_header_text = np.fromiter(
+                (self._HEADER_TEXT_RE.search(text.strip().lower()) is not None for text in page.text),
+                dtype=bool, count=len(page.text))
 
+        for row in [all_rows[r] for r in nearby]:
             # Check each block in the row
-            for block in row:
-                text = block['text'].strip().lower()
-                block_x = block['bbox'][0][0]
-
-                # Check if this text is a date, year, or header keyword
-                is_header_text = False
-
-                # Check date patterns
-                for pattern in date_patterns:
-                    if re.search(pattern, text, re.IGNORECASE):
-                        is_header_text = True
-                        break
-
-                # Check keywords
-                if not is_header_text:
-                    for keyword in header_keywords:
-                        if keyword in text:
-                            is_header_text = True
-                            break
+            for idx in row:
+                block_x = page.X[idx]
 
-                # Check if it aligns with a column
-                if is_header_text:
+                if page.is_header_text[idx]:
                     for boundary in column_boundaries:
                         if abs(block_x - boundary) < 50:  # 50px tolerance
                             # Check if we already have text for this column
                             existing = False
                             for hb in header_blocks:
-                                if abs(hb['bbox'][0][0] - block_x) < 30:
+                                if abs(page.X[hb] - block_x) < 30:
                                     existing = True
                                     break
 
                             if not existing:
-                                header_blocks.append(block)
+                                header_blocks.append(idx)
                             break
 
         # Return constructed header if we found aligned text/dates
-        return header_blocks if len(header_blocks) >= 2 else None
+        return np.array(header_blocks) if len(header_blocks) >= 2 else None
 
-    def extract_tables_from_page(self, text_blocks: List[Dict], page_num: int) -> List[Dict]:
+    def extract_tables_from_page(self, text_blocks: Union[List[Dict], PageIndex], page_num: int) -> List[Dict]:
         """
         Extract tables from text blocks for a single page.
+        text_blocks is either a list of block dicts or a prebuilt PageIndex.
         Returns list of detected tables with HTML structure.
         """
-        if not text_blocks:
+        if isinstance(text_blocks, PageIndex):
+            page = text_blocks
+        elif text_blocks:
+            page = PageIndex.from_blocks(text_blocks)
+        else:
             return []
 
-        return self._detect_tables_from_coordinates(text_blocks, page_num)
+        return self._detect_tables_from_coordinates(page, page_num)
 
-    def _detect_tables_from_coordinates(self, text_blocks: List[Dict], page_num: int) -> List[Dict]:
+    def _detect_tables_from_coordinates(self, page: PageIndex, page_num: int) -> List[Dict]:
         """
         Detect tables by analyzing text block coordinates.
         Identifies headers and data rows, then merges them into complete tables.
         """
-        if not text_blocks:
+        if not page.text:
             return []
 
         tables_data = []
 
         try:
             # Step 1: Group blocks into rows by Y coordinates
-            rows = self._group_into_rows(text_blocks)
+            rows = self._group_into_rows(page)
 
             # Step 2: Identify potential header rows and data rows
+            # Each row is classified once; the flags are reused when building HTML
+            page.row_is_header = np.array([self._is_header_row(page, row) for row in rows], dtype=bool)
             header_rows = []
+            header_row_nums = []
             data_rows = []
+            data_row_nums = []
 
-            for row in rows:
-                if self._is_header_row(row):
+            for row_num, (row, is_header) in enumerate(zip(rows, page.row_is_header)):
+                if is_header:
                     header_rows.append(row)
-                elif self._is_financial_row(row):
+                    header_row_nums.append(row_num)
+                elif self._is_financial_row(page, row):
                     data_rows.append(row)
+                    data_row_nums.append(row_num)
 
             if not data_rows:
                 return []
 
-            logger.info(f"Worker {self.worker_id}: Page {page_num} - Found {len(header_rows)} headers, {len(data_rows)} data rows")
-
             # Step 3: Group data rows into logical tables
-            data_tables = self._group_rows_into_tables(data_rows)
+            data_tables = self._group_rows_into_tables(page, data_rows, data_row_nums)
 
             # Step 4: Match headers with tables and create HTML
             last_header = None
             last_column_boundaries = None
+            table_shapes = []  # (rows, columns) per table, for the page summary log
 
             for table in data_tables:
                 # Detect column structure from this table
-                column_boundaries = self._detect_column_boundaries(table)
+                column_boundaries = self._detect_column_boundaries(page, table)
 
                 # Find matching header for this table (pass all rows for header construction)
-                matched_header = self._find_matching_header(header_rows, table, column_boundaries, rows)
+                matched_header = self._find_matching_header(page, header_rows, header_row_nums, table,
+                                                            column_boundaries, rows)
 
                 # If no header found but columns match previous table, reuse last header
-                if not matched_header and last_header and last_column_boundaries:
+                if matched_header is None and last_header is not None and last_column_boundaries:
                     # Check if column structures are similar
                     if self._columns_match(column_boundaries, last_column_boundaries):
                         matched_header = last_header
 
                 # Store header for potential reuse
-                if matched_header:
+                if matched_header is not None:
                     last_header = matched_header
                     last_column_boundaries = column_boundaries
 
                 # Combine header with table if found
-                if matched_header:
+                if matched_header is not None:
                     complete_table = [matched_header] + table
                 else:
                     complete_table = table
 
                 # Create HTML table
-                html_table = self._create_aligned_html_table(complete_table, column_boundaries)
+                html_table, cell_texts = self._create_aligned_html_table(page, complete_table, column_boundaries)
 
                 tables_data.append({
-                    "html_structure": html_table
+                    "html_structure": html_table,
+                    "cell_texts": cell_texts  # Stripped, non-empty cell texts, for callers filtering table text
                 })
+                table_shapes.append((len(complete_table), len(column_boundaries)))
 
-                logger.info(f"Worker {self.worker_id}: Page {page_num} - Created table with {len(complete_table)} rows, {len(column_boundaries)} columns")
+            # One summary record per page; per-document totals are logged by the worker
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Worker {self.worker_id}: Page {page_num} - {len(header_rows)} headers, "
+                             f"{len(data_rows)} data rows, tables (rows x columns): "
+                             f"{', '.join(f'{r}x{c}' for r, c in table_shapes)}")
 
         except Exception as e:
             logger.warning(f"Worker {self.worker_id}: Page {page_num} - Table detection error: {e}")
 
         return tables_data
 
-    def _group_into_rows(self, text_blocks: List[Dict]) -> List[List[Dict]]:
-        """Group text blocks into rows based on Y coordinates."""
-        if not text_blocks:
+    def _group_into_rows(self, page: PageIndex) -> List[np.ndarray]:
+        """Group text blocks into rows based on Y coordinates. Each row is an X-sorted array of block indices."""
+        if not page.text:
             return []
 
-        # Sort by Y coordinate
-        sorted_blocks = sorted(text_blocks, key=lambda b: (b['bbox'][0][1] + b['bbox'][2][1]) / 2)
-
-        rows = []
-        current_row = [sorted_blocks[0]]
+        # Sort by Y coordinate, then start a new row wherever consecutive blocks are too far apart
         row_threshold = 10  # Tighter threshold to avoid merging different rows
-
-        for block in sorted_blocks[1:]:
-            current_y = (block['bbox'][0][1] + block['bbox'][2][1]) / 2
-            prev_y = (current_row[-1]['bbox'][0][1] + current_row[-1]['bbox'][2][1]) / 2
-
-            if abs(current_y - prev_y) <= row_threshold:
-                current_row.append(block)
-            else:
-                # Sort row by X coordinate before adding
-                rows.append(sorted(current_row, key=lambda b: b['bbox'][0][0]))
-                current_row = [block]
-
-        # Add last row
-        if current_row:
-            rows.append(sorted(current_row, key=lambda b: b['bbox'][0][0]))
-
+        order = np.argsort(page.Y, kind='stable')
+        breaks = _split_points(page.Y[order], row_threshold)
+
+        # Row number of each Y-sorted block, then sort by (row, X) in one stable lexsort so every
+        # row comes out X-sorted without a per-row argsort
+        row_ids = np.zeros(len(order), dtype=np.int32)
+        row_ids[breaks] = 1
+        np.cumsum(row_ids, out=row_ids)
+        page.row_of[order] = row_ids
+        order = order[np.lexsort((page.X[order], row_ids))]
+
+        rows = np.split(order, breaks)
+        row_starts = np.concatenate(([0], breaks)).astype(np.intp)
+        page.rows = rows
+        page.row_y = page.Y[order[row_starts]]
+        page.row_has_digit = np.logical_or.reduceat(page.has_digit[order], row_starts)
         return rows
 
-    def _is_financial_row(self, row: List[Dict]) -> bool:
+    def _is_financial_row(self, page: PageIndex, row: np.ndarray) -> bool:
         """Check if a row contains financial data (text + numbers or multiple numbers)."""
         if len(row) < 1:  # Allow single-block rows if they're part of a table
             return False
 
-        has_text = False
-        has_number = False
-        num_count = 0
-        total_blocks = len(row)
-
-        for block in row:
-            text = block['text']
-            # Check if it's a number (including French format with spaces)
-            if any(char.isdigit() for char in text):
-                has_number = True
-                # Count if this is primarily numeric
-                clean_text = text.replace(' ', '').replace(',', '')
-                if sum(1 for c in clean_text if c.isdigit() or c in '-.') / max(len(clean_text), 1) > 0.5:
-                    num_count += 1
-            # Check if it's text (not just numbers or symbols)
-            elif any(char.isalpha() for char in text) and len(text) > 2:
-                has_text = True
-
-        # Financial row = has meaningful content and structure
-        # More permissive: any row with text or numbers that's part of table structure
-        return (has_text or has_number) and total_blocks >= 1
-
-    def _detect_column_boundaries(self, table_rows: List[List[Dict]]) -> List[float]:
+        # Any number (including French format with spaces) makes it a financial row
+        # (rows passed here are page rows, so their digit flag is precomputed)
+        if page.row_has_digit[page.row_of[row[0]]]:
+            return True
+
+        # Otherwise it needs meaningful text (not just symbols)
+        # More permissive: any row with text that's part of table structure
+        return any(len(page.text[i]) > 2 and _ALPHA_RE.search(page.text[i]) for i in row)
+
+    def _detect_column_boundaries(self, page: PageIndex, table_rows: List[np.ndarray]) -> List[float]:
         """
         Detect column boundaries by analyzing X positions across all rows.
         Returns list of X coordinates that represent column starts.
@@ -314,39 +419,22 @@ class TableExtractor:
         if not table_rows:
             return []
 
-        # Find the leftmost position across all rows (for row labels)
-        min_x = float('inf')
-        for row in table_rows:
-            for block in row:
-                min_x = min(min_x, block['bbox'][0][0])
-
-        # Collect all unique X positions with their frequency
-        x_position_counts = {}
-        for row in table_rows:
-            for block in row:
-                x = block['bbox'][0][0]  # Left edge X
-                # Round to nearest 10px to group similar positions
-                x_rounded = round(x / 10) * 10
-                x_position_counts[x_rounded] = x_position_counts.get(x_rounded, 0) + 1
-
-        # Sort X positions
-        x_positions = sorted(x_position_counts.keys())
-
-        if not x_positions:
+        xs = page.X[np.concatenate(table_rows)]
+        if not len(xs):
             return []
 
-        # Always include the leftmost position as first column
-        # This ensures row labels are captured
-        leftmost = round(min_x / 10) * 10
-
-        # Group nearby X positions to identify columns
-        clusters = [leftmost]  # Start with leftmost position
-        current_cluster = []
+        # Histogram of left-edge X positions in 10px bins (round to nearest 10px to group
+        # similar positions). Bin 0 is the leftmost position, which is always the first
+        # column so that row labels are captured.
+        bins = np.round(xs / 10).astype(np.int64)
+        leftmost_bin = bins.min()
+        counts = np.bincount(bins - leftmost_bin)
+        positions = np.flatnonzero(counts)  # Occupied bins, sorted
 
         # Dynamically determine threshold based on document type
         # For wide financial statements, use larger threshold
         # For dense tables, use smaller threshold
-        x_range = max(x_positions) - min(x_positions) if x_positions else 0
+        x_range = positions[-1] * 10
 
         if x_range > 600:  # Wide document, likely financial statement
             cluster_threshold = 100  # Larger threshold for wide columns
@@ -354,211 +442,169 @@ class TableExtractor:
             cluster_threshold = 70
         else:
             cluster_threshold = 50  # Smaller threshold for narrow tables
-
-        for x in x_positions:
-            # Skip if too close to leftmost (already included)
-            if abs(x - leftmost) < cluster_threshold:
-                continue
-
-            if not current_cluster or x - current_cluster[-1] < cluster_threshold:
-                current_cluster.append(x)
-            else:
-                # Use the most frequent position in cluster
-                if current_cluster:
-                    cluster_representative = min(current_cluster,
-                        key=lambda p: -x_position_counts.get(p, 0))
-                    clusters.append(cluster_representative)
-                current_cluster = [x]
-
-        # Add last cluster
-        if current_cluster:
-            cluster_representative = min(current_cluster,
-                key=lambda p: -x_position_counts.get(p, 0))
-            clusters.append(cluster_representative)
-
-        # Ensure clusters are unique and sorted
-        clusters = sorted(set(clusters))
+        window = cluster_threshold // 10  # Threshold in bins
+
+        # Skip positions too close to leftmost (already included), then split the rest
+        # into clusters wherever the gap between neighbouring positions reaches the threshold
+        candidates = positions[positions >= window]
+        starts = _split_points(candidates, window - 1)
+
+        # Use the most frequent position in each cluster (the first one on ties): per-cluster maxima
+        # via reduceat, then the first candidate of each cluster that reaches its maximum
+        clusters = [0]
+        if len(candidates):
+            starts = np.concatenate(([0], starts))
+            freq = counts[candidates]
+            cluster_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(candidates))))
+            is_max = freq == np.maximum.reduceat(freq, starts)[cluster_of]
+            _, first = np.unique(cluster_of[is_max], return_index=True)
+            clusters += candidates[is_max][first].tolist()
 
         # Limit to reasonable number of columns for financial tables
         if len(clusters) > 8:  # Most financial tables have <= 8 columns
             # Keep first column (labels) and most significant others
             first_col = clusters[0]
-            other_cols = clusters[1:]
+            other_cols = np.array(clusters[1:])
 
-            # Sort other columns by frequency
-            cols_with_freq = [(c, sum(x_position_counts.get(p, 0)
-                for p in x_position_counts if abs(p - c) < cluster_threshold))
-                for c in other_cols]
-            cols_with_freq.sort(key=lambda x: -x[1])
+            # Frequency of each column = number of blocks within the threshold window around it,
+            # read off a prefix sum of the histogram
+            prefix = np.concatenate(([0], np.cumsum(counts)))
+            lo = np.clip(other_cols - (window - 1), 0, len(counts))
+            hi = np.clip(other_cols + window, 0, len(counts))
+            freq = prefix[hi] - prefix[lo]
 
             # Keep first column and top 7 others
-            clusters = [first_col] + sorted([c for c, _ in cols_with_freq[:7]])
+            top = np.sort(other_cols[np.argsort(-freq, kind='stable')[:7]])
+            clusters = [first_col] + top.tolist()
 
-        return clusters
+        return ((np.array(clusters, dtype=np.int64) + leftmost_bin) * 10.0).tolist()
 
-    def _group_rows_into_tables(self, rows: List[List[Dict]]) -> List[List[List[Dict]]]:
+    def _group_rows_into_tables(self, page: PageIndex, rows: List[np.ndarray],
+                                row_nums: List[int]) -> List[List[np.ndarray]]:
         """
         Group rows into logical tables based on vertical proximity.
         Rows that are far apart likely belong to different tables.
+        row_nums holds the page row number of each row, to read per-row data off the page.
         """
         if not rows:
             return []
 
         tables = []
-        current_table = [rows[0]]
         table_gap_threshold = 50  # Rows more than 50px apart are different tables
 
-        for i in range(1, len(rows)):
-            current_row = rows[i]
-            prev_row = rows[i-1]
-
-            # Compare Y positions
-            current_y = (current_row[0]['bbox'][0][1] + current_row[0]['bbox'][2][1]) / 2
-            prev_y = (prev_row[0]['bbox'][0][1] + prev_row[0]['bbox'][2][1]) / 2
-
-            # Group by proximity only - don't check column structure as it varies in financial tables
-            if current_y - prev_y <= table_gap_threshold:
-                current_table.append(current_row)
-            else:
-                # Start new table
-                if len(current_table) >= 1:  # Allow single-row tables
-                    # Validate it's actually a table (has some multi-column rows or numbers)
-                    if self._validate_table_structure(current_table):
-                        tables.append(current_table)
-                current_table = [current_row]
-
-        # Add last table
-        if len(current_table) >= 1 and self._validate_table_structure(current_table):
-            tables.append(current_table)
-
-        return tables
+        # Group by proximity only - don't check column structure as it varies in financial tables
+        bounds = [0] + _split_points(page.row_y[row_nums], table_gap_threshold).tolist() + [len(rows)]
 
-    def _validate_table_structure(self, table_rows: List[List[Dict]]) -> bool:
-        """
-        Validate that rows actually form a table structure.
-        A valid table should have:
-        - At least some rows with multiple columns OR
-        - Numeric content indicating financial data
-        """
-        # Single-row tables are OK if they have multiple columns or numbers
-        if len(table_rows) == 1:
-            row = table_rows[0]
-            # Accept if it has multiple columns
-            if len(row) >= 2:
-                return True
-            # Or if it has numeric content (like a total)
-            for block in row:
-                if any(c.isdigit() for c in block['text']):
-                    return True
-            return False
+        # Validation counters in the same pass over the rows: prefix sums of multi-column rows and
+        # rows with numeric content make each candidate table's check O(1)
+        multi_column = np.cumsum([0] + [len(row) >= 2 for row in rows])
+        with_numbers = np.cumsum(np.concatenate(([0], page.row_has_digit[row_nums])))
 
-        # For multi-row tables
-        multi_column_rows = sum(1 for row in table_rows if len(row) >= 2)
-
-        # At least 1 row should have multiple columns
-        # Or have significant numeric content
-        if multi_column_rows == 0:
-            # Check for numeric content
-            num_rows_with_numbers = 0
-            for row in table_rows:
-                for block in row:
-                    if any(c.isdigit() for c in block['text']):
-                        num_rows_with_numbers += 1
-                        break
-
-            # If less than 30% of rows have numbers, not a table
-            if num_rows_with_numbers < len(table_rows) * 0.3:
-                return False
+        for start, end in zip(bounds, bounds[1:]):
+            # Validate it's actually a table: at least 1 row with multiple columns,
+            # or at least 30% of rows with numbers (so a single-row total is allowed)
+            if (multi_column[end] - multi_column[start] > 0
+                    or with_numbers[end] - with_numbers[start] >= (end - start) * 0.3):
+                tables.append(rows[start:end])
 
-        return True
+        return tables
 
-    def _create_aligned_html_table(self, table_rows: List[List[Dict]], column_boundaries: List[float]) -> str:
+    def _create_aligned_html_table(self, page: PageIndex, table_rows: List[np.ndarray],
+                                   column_boundaries: List[float]) -> Tuple[str, frozenset]:
         """
         Create an HTML table with proper column alignment based on detected boundaries.
         First row is header if it contains header-like content.
+        Returns the HTML and the set of its (stripped, non-empty) cell texts.
         """
         if not table_rows or not column_boundaries:
-            return "<table></table>"
-
-        html = ["<table>"]
-
-        for row_idx, row in enumerate(table_rows):
+            return "<table></table>", frozenset()
+
+        # Write straight into one buffer instead of holding a fragment list alongside the joined result
+        html = io.StringIO()
+        html.write("<table>")
+        cell_texts = set()
+
+        # Sort each row's blocks by X position (page rows already are; only constructed headers need it),
+        # then assign every block of the table to its closest column boundary with one binary search
+        sorted_rows = [row if self._is_page_row(page, row) else row[np.argsort(page.X[row], kind='stable')]
+                       for row in table_rows]
+        blocks = np.concatenate(sorted_rows)
+        col_of = _nearest_index(np.asarray(column_boundaries, dtype=np.float64), page.X[blocks])
+        row_ends = np.cumsum([len(row) for row in sorted_rows]).tolist()
+
+        start = 0
+        for row_idx, (row, end) in enumerate(zip(table_rows, row_ends)):
             # First row is header if it looks like a header
-            is_header = row_idx == 0 and self._is_header_row(row)
-            tag = "th" if is_header else "td"
-
-            html.append("<tr>")
-
-            # Create cells based on column boundaries
-            cells = [""] * len(column_boundaries)
-
-            # Sort blocks by X position for proper column assignment
-            sorted_blocks = sorted(row, key=lambda b: b['bbox'][0][0])
-
-            for block in sorted_blocks:
-                # Find which column this block belongs to
-                block_x = block['bbox'][0][0]
-                col_idx = 0  # Default to first column
-
-                # Find the closest column boundary
-                min_distance = float('inf')
-                for i, boundary in enumerate(column_boundaries):
-                    distance = abs(block_x - boundary)
-                    if distance < min_distance:
-                        min_distance = distance
-                        col_idx = i
-
-                # Ensure we don't go out of bounds
-                col_idx = min(col_idx, len(cells) - 1)
-
-                # Add text to the appropriate cell
-                if cells[col_idx]:
-                    cells[col_idx] += " " + block['text']
-                else:
-                    cells[col_idx] = block['text']
-
-            # Add cells to HTML without any styling
-            for cell in cells:
-                html.append(f"<{tag}>{cell}</{tag}>")
-
-            html.append("</tr>")
-
-        html.append("</table>")
-        return "".join(html)
-
-    def _is_header_row(self, row: List[Dict]) -> bool:
+            is_header = row_idx == 0 and self._row_is_header(page, row)
+            open_tag, close_tag = _CELL_TAGS[is_header]
+
+            # Create cells based on column boundaries; each collects its texts, joined once below
+            cells = [[] for _ in column_boundaries]
+            for i, col_idx in zip(blocks[start:end].tolist(), col_of[start:end].tolist()):
+                cells[col_idx].append(page.text[i])
+            start = end
+
+            cells = [" ".join(cell) for cell in cells]
+            cell_texts.update(cell.strip() for cell in cells)
+
+            # Add the row to HTML without any styling; OCR text is escaped so it cannot inject markup
+            html.write("<tr>" + "".join(open_tag + escape(cell, quote=False) + close_tag
+                                        for cell in cells) + "</tr>")
+
+        html.write("</table>")
+        cell_texts.discard("")
+        return html.getvalue(), frozenset(cell_texts)
+
+    def _is_page_row(self, page: PageIndex, row: np.ndarray) -> bool:
+        """Whether row is one of the page rows built by _group_into_rows (rather than a constructed header)."""
+        row_num = page.row_of[row[0]]
+        return row_num < len(page.rows) and page.rows[row_num] is row
+
+    def _row_is_header(self, page: PageIndex, row: np.ndarray) -> bool:
+        """Header classification of a row, served from the per-page cache when it is a whole page row."""
+        if self._is_page_row(page, row) and len(page.row_is_header):
+            return bool(page.row_is_header[page.row_of[row[0]]])
+        return self._is_header_row(page, row)
+
+    def _is_header_row(self, page: PageIndex, row: np.ndarray) -> bool:
         """
         Determine if a row is likely a header based on content.
         Headers typically have more text and common keywords.
         """
-        header_keywords = [
-            'actif', 'passif', 'total', 'brut', 'amortissement', 'amort',
-            'net', 'exercice', 'capital', 'reserves', 'resultat',
-            'charges', 'produits', 'exploitation', 'financier',
-            'montant', 'date', 'libelle', 'compte', 'deprec',
-            'n-1', 'n+1', '2023', '2022', '2024', '2021'
-        ]
-
-        text_content = " ".join([block['text'].lower() for block in row])
+        text_content = " ".join([page.text[i].lower() for i in row])
 
-        # Check for year patterns (common in headers)
-        import re
-        has_year = bool(re.search(r'\b(19|20)\d{2}\b', text_content))
-
-        # Check for date patterns like 31/12/2023
-        has_date = bool(re.search(r'\d{1,2}/\d{1,2}/\d{4}', text_content))
+        # Row needs a header marker: year patterns (common in headers), dates like 31/12/2023,
+        # or header keywords - each scan runs only if the previous ones found nothing
+        if not (self._YEAR_RE.search(text_content)
+                or self._DATE_RE.search(text_content)
+                or self._HEADER_KEYWORD_RE.search(text_content)):
+            return False
 
-        # Check for header keywords
-        has_keyword = any(keyword in text_content for keyword in header_keywords)
+        # Short rows qualify without the text/number balance check
+        if len(row) <= 4:
+            return True
 
         # Check if mostly text (not numbers) - but dates are OK
         # Remove dates and years before counting
-        clean_text = re.sub(r'\d{1,2}/\d{1,2}/\d{4}', '', text_content)
-        clean_text = re.sub(r'\b(19|20)\d{2}\b', '', clean_text)
+        clean_text = self._DATE_RE.sub('', text_content)
+        clean_text = self._YEAR_RE.sub('', clean_text)
+
+        num_chars = len(clean_text) - len(clean_text.translate(_DEL_DIGITS))
+        text_chars = len(_ALPHA_RE.findall(clean_text))
+        return text_chars > num_chars * 1.5  # Slightly less strict
+
+
+# Per-process extractor for extraction process pools (see init_extraction_process)
+_process_extractor = None
+
+
+def init_extraction_process(worker_id: str = ""):
+    """Process pool initializer: build the TableExtractor once per pool process."""
+    global _process_extractor
+    _process_extractor = TableExtractor(worker_id)
 
-        num_chars = sum(1 for c in clean_text if c.isdigit())
-        text_chars = sum(1 for c in clean_text if c.isalpha())
-        is_mostly_text = text_chars > num_chars * 1.5  # Slightly less strict
 
-        # Row is header if it has keywords, dates/years, or is mostly text
-        return (has_keyword or has_year or has_date) and (is_mostly_text or len(row) <= 4)
\ No newline at end of file
+def extract_page_tables(page: Tuple[List[str], np.ndarray, int]) -> List[Dict]:
+    """Pool task: extract the tables of one (texts, boxes, page_num) page."""
+    texts, boxes, page_num = page
+    return _process_extractor.extract_tables_from_page(PageIndex(texts, boxes), page_num)
@@ -4,7 +4,9 @@ import signal
 import sys
 import os
 import socket
-from worker_lightweight import LightweightOCRWorker
+import queue
+import threading
+from database import DatabaseHandler
 from config import Config
 
 # Configure logging
@@ -25,26 +27,108 @@ logging.getLogger('botocore').setLevel(logging.WARNING)
 logging.getLogger('s3transfer').setLevel(logging.WARNING)
 logging.getLogger('urllib3').setLevel(logging.WARNING)
 
-def run_worker(worker_id):
-    """Run a single lightweight OCR worker process"""
-    # Generate worker ID
-    hostname = socket.gethostname()
-
+def worker_id_prefix():
+    """Container-level worker ID prefix"""
     if os.environ.get('ACI_NAME'):
         # Running in Azure Container Instance
-        actual_worker_id = f"{os.environ.get('ACI_NAME')}-{worker_id}"
-    else:
-        # Local Docker or testing
-        actual_worker_id = f"{hostname}-lightweight-{worker_id}"
+        return os.environ.get('ACI_NAME')
+    # Local Docker or testing
+    return f"{socket.gethostname()}-lightweight"
+
+def cores_per_worker():
+    """Fewest cores a worker gets when the container's cores are split between them"""
+    return max(1, len(os.sched_getaffinity(0)) // Config.WORKERS_PER_CONTAINER)
+
+def worker_cores(worker_id):
+    """
+    Slice of the container's cores for worker worker_id: an even split, the remainder going one
+    extra core each to the first workers. With more workers than cores they share them round-robin.
+    """
+    cores = sorted(os.sched_getaffinity(0))
+    per, extra = divmod(len(cores), Config.WORKERS_PER_CONTAINER)
+    if per == 0:
+        return [cores[worker_id % len(cores)]]
+    start = worker_id * per + min(worker_id, extra)
+    return cores[start:start + per + (worker_id < extra)]
+
+def pin_worker(worker_id):
+    """Pin worker worker_id to its own slice of the container's cores and size its thread pools to it"""
+    os.sched_setaffinity(0, worker_cores(worker_id))
+    # Paddle sizes its math library threads from cpu_threads (see LightweightOCRWorker); this covers
+    # OpenMP/MKL users that read the environment when they first start their thread pool
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'PADDLE_NUM_THREADS'):
+        os.environ[var] = str(len(os.sched_getaffinity(0)))
+
+def run_worker(worker_id, doc_queue):
+    """Run a single lightweight OCR worker process"""
+    # Imported here so the main process never loads PaddleOCR/boto3; workers get it
+    # already imported from the forkserver preload
+    from worker_lightweight import LightweightOCRWorker
+
+    actual_worker_id = f"{worker_id_prefix()}-{worker_id}"
+    pin_worker(worker_id)
 
     logging.info(f"Starting lightweight worker: {actual_worker_id}")
     worker = LightweightOCRWorker(actual_worker_id)
-    worker.process_documents()
+    worker.process_documents(doc_queue)
+
+# Set by the signal handler: stop claiming and shut the workers down
+_shutdown = threading.Event()
+
+def dispatch_documents(doc_queue, processes):
+    """
+    Claim documents for the whole container and feed them to the shared queue.
+    Whichever worker is free takes the next document, so a worker stuck on a
+    large filing does not hold a backlog of already claimed documents.
+    Returns on shutdown (or once every worker has exited) after releasing the
+    documents still queued and telling each worker to stop.
+    """
+    db = DatabaseHandler()
+    undelivered = []
+    while not _shutdown.is_set() and any(p.is_alive() for p in processes):
+        docs = db.get_next_documents(worker_id_prefix(), len(processes))
+        if not docs:
+            _shutdown.wait(5)
+            continue
+        for i, doc in enumerate(docs):
+            if not queue_document(doc_queue, doc, processes):
+                undelivered = docs[i:]
+                break
+    stop_workers(db, doc_queue, processes, undelivered)
+
+def queue_document(doc_queue, doc, processes):
+    """Put doc on the queue, waiting while every worker is busy and the queue is full; False if
+    shutdown started (or no worker is left) before it could be queued"""
+    while True:
+        try:
+            doc_queue.put(dict(doc), timeout=5)
+            return True
+        except queue.Full:
+            if _shutdown.is_set() or not any(p.is_alive() for p in processes):
+                return False
+
+def stop_workers(db, doc_queue, processes, undelivered):
+    """Hand claimed documents no worker has taken back to pending, then queue one None (stop) per worker"""
+    doc_ids = [doc['id'] for doc in undelivered]
+    while True:
+        try:
+            doc = doc_queue.get(timeout=0.5)
+        except queue.Empty:
+            break
+        if doc is not None:
+            doc_ids.append(doc['id'])
+    db.release_documents(doc_ids)
+
+    for _ in range(sum(p.is_alive() for p in processes)):
+        try:
+            doc_queue.put(None, timeout=5)
+        except queue.Full:
+            break
 
 def signal_handler(sig, frame):
-    """Handle shutdown signals gracefully"""
+    """Handle shutdown signals gracefully: workers finish their current document, then exit"""
     logging.info('Shutting down lightweight OCR workers...')
-    sys.exit(0)
+    _shutdown.set()
 
 def main():
     """Main entry point for lightweight OCR service"""
@@ -59,23 +143,33 @@ def main():
     logging.info(f"  - OCR Engine: PaddleOCR 2.8.1")
     logging.info(f"  - Processing Mode: Lightweight (no PPStructure)")
     logging.info(f"  - Workers per container: {num_workers}")
-    logging.info(f"  - CPU threads per worker: 4")
+    logging.info(f"  - CPU threads per worker: {', '.join(str(len(worker_cores(i))) for i in range(num_workers))}")
     logging.info(f"  - Memory limit per worker: ~20GB (40GB per container / 2 workers)")
 
-    # Start worker processes
+    # Size OpenMP/MKL thread pools to the smallest worker core slice. Set before the first worker
+    # starts the forkserver, which loads paddle (and its OpenMP runtime) on preload; each worker
+    # then resizes them to its own slice in pin_worker.
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'PADDLE_NUM_THREADS'):
+        os.environ[var] = str(cores_per_worker())
+    # Bind OpenMP threads one per core, compactly within the worker's pinned slice
+    os.environ.setdefault('KMP_AFFINITY', 'granularity=fine,compact,1,0')
+
+    # Start worker processes, all fed from one bounded document queue
+    doc_queue = multiprocessing.Queue(maxsize=num_workers)
     processes = []
     for i in range(num_workers):
         p = multiprocessing.Process(
             target=run_worker,
-            args=(i,),
+            args=(i, doc_queue),
             name=f"OCRWorker-{i}"
         )
         p.start()
         processes.append(p)
         logging.info(f"Started worker process {i} (PID: {p.pid})")
 
-    # Monitor worker processes
+    # Claim documents for the workers until they have all exited
     try:
+        dispatch_documents(doc_queue, processes)
         for p in processes:
             p.join()
     except KeyboardInterrupt:
@@ -87,4 +181,8 @@ def main():
     logging.info("All workers shut down successfully")
 
 if __name__ == "__main__":
+    # Workers start from a forkserver that has already imported the OCR stack (paddleocr,
+    # numpy, cv2 via worker_lightweight), instead of forking this process or re-importing per worker
+    multiprocessing.set_start_method('forkserver')
+    multiprocessing.set_forkserver_preload(['worker_lightweight'])
     main()
\ No newline at end of file
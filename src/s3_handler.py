@@ -1,37 +1,86 @@
 #!/usr/bin/env python3
 """S3 Handler for OCR service"""
 
+import io
 import os
+import gzip
 import json
 import logging
 import tempfile
+import threading
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 from src.config import Config
 
 logger = logging.getLogger('S3Handler')
 
+# Keep-alive connection pool and adaptive retries shared by every S3 call of the process
+_S3_CONFIG = BotoConfig(
+    max_pool_connections=50,
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+
+# One client per process, created lazily so forked workers never share connections
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide S3 client, creating it on first use"""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = boto3.client(
+                's3',
+                aws_access_key_id=Config.S3_ACCESS_KEY,
+                aws_secret_access_key=Config.S3_SECRET_KEY,
+                region_name=Config.S3_REGION,
+                config=_S3_CONFIG
+            )
+    return _CLIENT
+
+
+def s3_url(key):
+    """Public URL of an object key stored in download_status (rows written before keys were stored hold full URLs)"""
+    if not key or key.startswith('https://'):
+        return key
+    return f"https://{Config.S3_BUCKET}.s3.{Config.S3_REGION}.amazonaws.com/{key}"
+
+
 class S3Handler:
     def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=Config.S3_ACCESS_KEY,
-            aws_secret_access_key=Config.S3_SECRET_KEY,
-            region_name=Config.S3_REGION
-        )
+        self.s3_client = get_client()
         self.bucket = Config.S3_BUCKET
+        # Large filings are fetched as parallel 8MB range GETs
+        self.download_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=8,
+            use_threads=True
+        )
+        # Multi-MB raw OCR JSON goes up as parallel 8MB parts
+        self.upload_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=4,
+            use_threads=True
+        )
 
     def download_pdf(self, s3_key):
         """Download PDF from S3 to temporary file"""
         try:
             # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+            temp_file = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False, dir=Config.TMP_DIR)
             temp_path = temp_file.name
             temp_file.close()
 
             # Download from S3
             logger.info(f"Downloading {s3_key} from S3...")
-            self.s3_client.download_file(self.bucket, s3_key, temp_path)
+            self.s3_client.download_file(self.bucket, s3_key, temp_path, Config=self.download_config)
             logger.info(f"Downloaded {s3_key} successfully")
 
             return temp_path
@@ -41,37 +90,41 @@ class S3Handler:
             raise
 
     def upload_json(self, json_data, output_key):
-        """Upload JSON data to S3"""
+        """Upload JSON data to S3, gzip-compressed (served with Content-Encoding: gzip)"""
         try:
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket,
-                Key=output_key,
-                Body=json_data,
-                ContentType='application/json'
+            if isinstance(json_data, str):
+                json_data = json_data.encode('utf-8')
+
+            # Upload to S3 (multipart above 8MB)
+            self.s3_client.upload_fileobj(
+                io.BytesIO(gzip.compress(json_data, compresslevel=3)),
+                self.bucket,
+                output_key,
+                ExtraArgs={'ContentType': 'application/json', 'ContentEncoding': 'gzip'},
+                Config=self.upload_config
             )
 
             logger.info(f"Uploaded to {output_key}")
             return True
 
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Failed to upload {output_key}: {e}")
             return False
 
-    def upload_text(self, text_data, output_key):
-        """Upload text file to S3"""
+    def upload_file(self, path, output_key, content_type='text/plain; charset=utf-8'):
+        """Upload a local file to S3, streamed from disk (multipart above 8MB)"""
         try:
-            # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket,
-                Key=output_key,
-                Body=text_data,
-                ContentType='text/plain; charset=utf-8'
+            self.s3_client.upload_file(
+                path,
+                self.bucket,
+                output_key,
+                ExtraArgs={'ContentType': content_type},
+                Config=self.upload_config
             )
 
-            logger.info(f"Uploaded text file to {output_key}")
+            logger.info(f"Uploaded file to {output_key}")
             return True
 
-        except ClientError as e:
-            logger.error(f"Failed to upload text file {output_key}: {e}")
-            return False
\ No newline at end of file
+        except (ClientError, S3UploadFailedError) as e:
+            logger.error(f"Failed to upload file {output_key}: {e}")
+            return False
@@ -2,167 +2,382 @@
 """Simplified Lightweight OCR Worker - Optimized version"""
 
 import os
+import ctypes
 import sys
 import time
+import queue
+import threading
 import json
 import logging
-import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pdf2image import convert_from_path
+import numpy as np
+try:
+    import orjson
+except ImportError:  # orjson is optional; falls back to the stdlib json module
+    orjson = None
+from pdf2image import convert_from_path, pdfinfo_from_path
 from paddleocr import PaddleOCR
 from src.config import Config
 from src.database import DatabaseHandler
-from src.s3_handler import S3Handler
-from src.extraction import TableExtractor
+from src.s3_handler import S3Handler, s3_url
+from src.extraction import (TableExtractor, PageIndex, REFERENCE_DPI, bbox_array, scale_to_reference,
+                            init_extraction_process, extract_page_tables)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('LightweightOCRWorker')
 
+# Pages rasterized per convert_from_path call (split over its pdftoppm processes) and rendered pages buffered ahead of OCR
+RENDER_CHUNK_PAGES = 4
+RENDER_QUEUE_PAGES = 8
+# Progress is logged every PROGRESS_LOG_PAGES OCR'd pages
+PROGRESS_LOG_PAGES = 30
+
+
+class _NumpyJSONEncoder(json.JSONEncoder):
+    """JSON encoder that converts numpy arrays and scalars as the encoder reaches them"""
+
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.integer):
+            return int(obj)
+        return super().default(obj)
+
+
+# glibc, to hand memory freed after a document back to the OS (None on other C libraries)
+try:
+    _LIBC = ctypes.CDLL('libc.so.6')
+except OSError:
+    _LIBC = None
+
+
+def release_free_memory():
+    """Return free heap memory held in glibc's malloc arenas to the OS"""
+    if _LIBC is not None:
+        _LIBC.malloc_trim(0)
+
+
+# oneDNN fully-connected fusion passes known to degrade recognition accuracy
+_BROKEN_MKLDNN_PASSES = ('fc_mkldnn_pass', 'fc_act_mkldnn_fuse_pass')
+
+
+@contextmanager
+def _without_broken_mkldnn_passes():
+    """Delete _BROKEN_MKLDNN_PASSES from the config of every Paddle predictor created in the block"""
+    # PaddleOCR builds and compiles its predictors in its constructor, so the passes have to be
+    # removed from their configs on the way into paddle.inference.create_predictor
+    from paddle import inference
+    create_predictor = inference.create_predictor
+
+    def create_predictor_without_passes(config):
+        for name in _BROKEN_MKLDNN_PASSES:
+            config.delete_pass(name)
+        return create_predictor(config)
+
+    inference.create_predictor = create_predictor_without_passes
+    try:
+        yield
+    finally:
+        inference.create_predictor = create_predictor
+
+
 class LightweightOCRWorker:
     def __init__(self, worker_id: str):
         self.worker_id = worker_id
-        self.db = DatabaseHandler()
+        self.db = DatabaseHandler(worker_id=worker_id)
         self.s3 = S3Handler()
         # Re-enabled: TableExtractor now works with PaddleOCR v2 format
         self.table_extractor = TableExtractor(worker_id)
 
+        # Table extraction is pure-Python CPU work: fan pages out to a process pool to bypass the GIL.
+        # forkserver children only import the extraction module, not the OCR model. They inherit the
+        # worker's core pinning, so the pool is sized to the worker's slice, not to the whole host.
+        extraction_processes = Config.EXTRACTION_PROCESSES
+        if extraction_processes is None:
+            extraction_processes = len(os.sched_getaffinity(0))
+        self.extraction_pool = None
+        if extraction_processes > 1:
+            self.extraction_pool = ProcessPoolExecutor(
+                max_workers=extraction_processes,
+                mp_context=multiprocessing.get_context('forkserver'),
+                initializer=init_extraction_process,
+                initargs=(worker_id,)
+            )
+
+        # Uploads the text output concurrently with the JSON one
+        self.upload_pool = ThreadPoolExecutor(max_workers=1)
+        # Set on shutdown so a prefetch waiting for new documents gives up
+        self.stopping = threading.Event()
+
         # Initialize OCR with PaddleOCR 2.8 - simpler and more stable
-        # Uses mobile models by default for CPU performance
-        self.ocr = PaddleOCR(
-            use_angle_cls=False,  # Disable angle classification for speed
-            lang='en',  # English model is more stable with v2
-            use_gpu=False,  # Explicitly use CPU
-            enable_mkldnn=True,  # Enable Intel MKL-DNN optimization
-            cpu_threads=4,  # Limit CPU threads per worker
-            use_tensorrt=False,  # Disable TensorRT (GPU only)
-            det_db_score_mode='fast',  # Fast detection mode
-            show_log=False  # Reduce logging noise
-        )
+        # Uses mobile models by default for CPU performance.
+        # One predictor per OCR thread (predictors are not thread-safe), each running on its share
+        # of the cores this worker is pinned to; ocr_page borrows whichever one is free
+        cpu_threads = max(1, len(os.sched_getaffinity(0)) // Config.OCR_THREADS)
+        self.ocr_engines = queue.Queue()
+        with _without_broken_mkldnn_passes():
+            for _ in range(Config.OCR_THREADS):
+                self.ocr_engines.put(PaddleOCR(
+                    use_angle_cls=False,  # Disable angle classification for speed
+                    lang='en',  # English model is more stable with v2
+                    use_gpu=False,  # Explicitly use CPU
+                    enable_mkldnn=True,  # Enable Intel MKL-DNN optimization
+                    cpu_threads=cpu_threads,  # One thread per core of this predictor's share
+                    use_tensorrt=False,  # Disable TensorRT (GPU only)
+                    det_db_score_mode='fast',  # Fast detection mode
+                    rec_batch_num=Config.OCR_REC_BATCH_NUM,  # Recognition batch size (memory vs. speed)
+                    show_log=False,  # Reduce logging noise
+                    **self._onnx_model_args()
+                ))
+        # OCRs several pages of a document at once when there is more than one predictor
+        self.ocr_pool = None
+        if Config.OCR_THREADS > 1:
+            self.ocr_pool = ThreadPoolExecutor(max_workers=Config.OCR_THREADS, thread_name_prefix=f"{worker_id}-ocr")
+        if Config.OCR_WARMUP:
+            self.warm_up()
         logger.info(f"Worker {worker_id}: OCR initialized")
 
-    def process_documents(self):
-        """Main processing loop"""
-        while True:
-            try:
-                # Get next document
-                doc = self.db.get_next_document(self.worker_id)
-                if not doc:
-                    time.sleep(5)
+    @staticmethod
+    def _onnx_model_args():
+        """PaddleOCR arguments to run det/rec through ONNX Runtime when OCR_ONNX_DIR holds exported models"""
+        if not Config.OCR_ONNX_DIR:
+            return {}
+        return {
+            'use_onnx': True,
+            'det_model_dir': os.path.join(Config.OCR_ONNX_DIR, 'det.onnx'),
+            'rec_model_dir': os.path.join(Config.OCR_ONNX_DIR, Config.OCR_ONNX_REC_MODEL),
+        }
+
+    def process_documents(self, doc_queue=None):
+        """
+        Main processing loop. Documents come from doc_queue when given (claimed by the
+        dispatcher in main.py, None = stop), otherwise they are claimed directly.
+        With PREFETCH_DOCUMENT, when claiming directly, the next document is taken and its PDF
+        downloaded in the background while the current one is processed. Not with doc_queue: a
+        prefetched document would wait behind this worker's current one instead of going to the
+        next free worker.
+        """
+        prefetcher = None
+        if Config.PREFETCH_DOCUMENT and doc_queue is None:
+            prefetcher = ThreadPoolExecutor(max_workers=1)
+        next_doc = None
+        try:
+            while True:
+                if next_doc is None:
+                    next_doc = self.submit_fetch(prefetcher, doc_queue)
+                try:
+                    doc, download = next_doc.result()
+                except Exception as e:
+                    # Could not claim a document (e.g. database error): try again
+                    logger.error(f"Worker {self.worker_id}: Error: {e}")
+                    next_doc = None
                     continue
+                next_doc = None
+                if doc is None:
+                    break
+                if prefetcher is not None:
+                    # At most one document is prefetched; a failure of this one does not affect it
+                    next_doc = self.submit_fetch(prefetcher, doc_queue)
 
-                self.process_single_document(doc)
+                try:
+                    if isinstance(download, Exception):
+                        raise download
+                    self.process_single_document(doc, *download)
 
-            except Exception as e:
-                logger.error(f"Worker {self.worker_id}: Error: {e}")
-                if doc:
+                except Exception as e:
+                    logger.error(f"Worker {self.worker_id}: Error: {e}")
                     self.db.mark_failed(doc['id'], str(e))
+        finally:
+            if prefetcher is not None:
+                # Stop waiting for documents; one already claimed (or being claimed) is handed back
+                self.stopping.set()
+                if next_doc is not None and not next_doc.cancel():
+                    next_doc.add_done_callback(self.release_prefetched)
+                prefetcher.shutdown(wait=False)
+            # Documents of the last claimed batch this worker will not get to go back to pending
+            self.db.release_claimed()
+            # Persist statuses still buffered for the current batch
+            self.db.flush_completed()
+            if self.extraction_pool is not None:
+                self.extraction_pool.shutdown()
+            if self.ocr_pool is not None:
+                self.ocr_pool.shutdown()
+            self.upload_pool.shutdown()
+
+    def release_prefetched(self, future):
+        """Release a prefetched document that will not be processed and delete its downloaded PDF"""
+        try:
+            if future.cancelled() or future.exception() is not None:
+                return
+            doc, download = future.result()
+            if doc is None:
+                return
+            if not isinstance(download, Exception) and os.path.exists(download[0]):
+                os.unlink(download[0])
+            self.db.release_documents([doc['id']])
+        finally:
+            # The prefetch may have claimed a new batch after process_documents released the last one
+            self.db.release_claimed()
+
+    def submit_fetch(self, prefetcher, doc_queue):
+        """Start fetching the next document on the prefetch thread; returns a future (already resolved without one)"""
+        if prefetcher is None:
+            future = Future()
+            try:
+                future.set_result(self.fetch_next_document(doc_queue))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return prefetcher.submit(self.fetch_next_document, doc_queue)
+
+    def fetch_next_document(self, doc_queue):
+        """
+        Wait for the next document and download its PDF. Returns (doc, (pdf_path, download_time)),
+        (doc, exception) when the download failed or (None, None) when told to stop.
+        """
+        # Get next document
+        if doc_queue is not None:
+            doc = doc_queue.get()
+            if doc is None:
+                return None, None
+        else:
+            doc = self.db.get_next_document(self.worker_id)
+            while not doc:
+                if self.stopping.wait(5):
+                    return None, None
+                doc = self.db.get_next_document(self.worker_id)
 
-    def process_single_document(self, doc):
-        """Process a single document"""
-        start_time = datetime.now()
+        # Download PDF
+        try:
+            download_start = time.perf_counter_ns()
+            pdf_path = self.s3.download_pdf(doc['s3_key'])
+            download_time = (time.perf_counter_ns() - download_start) / 1e9
+            logger.info(f"Worker {self.worker_id}: PDF download took {download_time:.2f}s")
+            return doc, (pdf_path, download_time)
+        except Exception as e:
+            return doc, e
+
+    def process_single_document(self, doc, pdf_path, download_time):
+        """Process a single document whose PDF was downloaded to pdf_path"""
+        # Timings count the download as if it had just happened, even when it was prefetched
+        start_time = time.perf_counter_ns() - int(download_time * 1e9)
         siren = doc['siren']
-        s3_key = doc['s3_key']
 
         logger.info(f"Worker {self.worker_id}: Processing {siren}")
 
-        # Download PDF
-        download_start = datetime.now()
-        pdf_path = self.s3.download_pdf(s3_key)
-        download_time = (datetime.now() - download_start).total_seconds()
-        logger.info(f"Worker {self.worker_id}: PDF download took {download_time:.2f}s")
-
         try:
-            # Convert PDF to images
-            convert_start = datetime.now()
-            images = convert_from_path(pdf_path, dpi=150, thread_count=4)
-            num_pages = len(images)
-            convert_time = (datetime.now() - convert_start).total_seconds()
-            logger.info(f"Worker {self.worker_id}: PDF conversion took {convert_time:.2f}s for {num_pages} pages")
+            num_pages = pdfinfo_from_path(pdf_path)['Pages']
 
             # Collect ALL results first
-            ocr_start = datetime.now()
+            ocr_start = time.perf_counter_ns()
             all_pages_data = []
             all_ocr_raw_results = []  # Store raw OCR results for JSON file
-            batch_size = 30  # Large batch size with 40GB memory available
+            ocr_pages = []  # (page_num, page_text, blocks, raw_result, tables future) per OCR'd page
 
-            import gc  # Import gc at the beginning
-
-            # Track timing for OCR vs extraction
+            # Track timing for conversion vs OCR vs extraction
+            convert_time = 0
             total_ocr_time = 0
             total_extraction_time = 0
 
-            # Process in batches
-            for batch_start in range(0, num_pages, batch_size):
-                batch_end = min(batch_start + batch_size, num_pages)
-                batch_results, batch_ocr_time, batch_extraction_time = self.process_batch(images[batch_start:batch_end], batch_start)
-
-                total_ocr_time += batch_ocr_time
-                total_extraction_time += batch_extraction_time
-
-                # Store results
-                for page_num, (page_data, raw_result) in enumerate(batch_results, batch_start + 1):
-                    all_pages_data.append(page_data)
-                    if raw_result:
-                        # Convert numpy arrays to lists for JSON serialization
-                        serializable_result = self._make_json_serializable(raw_result)
-                        all_ocr_raw_results.append({
-                            "page": page_num,
-                            "ocr_result": serializable_result
-                        })
-
-                # Free memory after each batch
-                gc.collect()
-
-                logger.info(f"Worker {self.worker_id}: Processed pages {batch_start+1}-{batch_end}")
-
-            # Clear images from memory
-            del images
-            gc.collect()
-
-            total_processing_time = (datetime.now() - ocr_start).total_seconds()
-            logger.info(f"Worker {self.worker_id}: Total processing took {total_processing_time:.2f}s (OCR: {total_ocr_time:.2f}s, Extraction: {total_extraction_time:.2f}s)")
+            # Three-stage pipeline: a render thread rasterizes pages into a bounded queue, pages are
+            # OCR'd in order (up to OCR_THREADS at once, see submit_ocr) and table extraction runs in the
+            # extraction pool (submit_extraction). Conversion time is the time spent waiting for rendered pages
+            ocr_futures = deque()  # (page_num, future) of the pages being OCR'd, oldest first
+            render_q = queue.Queue(maxsize=RENDER_QUEUE_PAGES)
+            stop_rendering = threading.Event()
+            renderer = threading.Thread(target=self.render_into, args=(pdf_path, num_pages, render_q, stop_rendering),
+                                        name=f"{self.worker_id}-render", daemon=True)
+            renderer.start()
+            try:
+                for page_num in range(1, num_pages + 1):
+                    convert_start = time.perf_counter_ns()
+                    image = self.next_rendered_page(render_q, renderer)
+                    convert_time += (time.perf_counter_ns() - convert_start) / 1e9
+                    if isinstance(image, Exception):
+                        raise image
+                    if image is None:
+                        raise RuntimeError(f"PDF rendering ended after {page_num - 1} of {num_pages} pages")
+
+                    ocr_futures.append((page_num, self.submit_ocr(image, page_num, pdf_path)))
+                    del image
+
+                    # Keep at most OCR_THREADS pages in flight; finished pages go to table extraction in order
+                    while len(ocr_futures) >= Config.OCR_THREADS or (page_num == num_pages and ocr_futures):
+                        done_page, ocr = ocr_futures.popleft()
+                        page_text, blocks, raw_result, page_ocr_time = ocr.result()
+                        total_ocr_time += page_ocr_time
+
+                        # Table extraction runs in the extraction pool while the next pages are OCR'd
+                        extraction_start = time.perf_counter_ns()
+                        tables = self.submit_extraction(blocks, done_page)
+                        total_extraction_time += (time.perf_counter_ns() - extraction_start) / 1e9
+                        ocr_pages.append((done_page, page_text, blocks, raw_result, tables))
+
+                        if done_page % PROGRESS_LOG_PAGES == 0 or done_page == num_pages:
+                            logger.info(f"Worker {self.worker_id}: OCR'd pages {done_page}/{num_pages}")
+            finally:
+                stop_rendering.set()
 
-            # Create initial timing info
+            # Extraction time = time not overlapped with OCR
+            extraction_start = time.perf_counter_ns()
+            for page_num, page_text, blocks, raw_result, tables in ocr_pages:
+                tables = tables.result()
+                all_pages_data.append({
+                    "page": page_num,
+                    "text": " ".join(page_text),
+                    **blocks,  # texts, boxes, scores
+                    "tables": tables,  # Add extracted tables
+                    "table_text": self.table_cell_texts(tables)  # To exclude from non-table text
+                })
+                if raw_result:
+                    # Numpy arrays are kept as is and handled when serializing (see dumps_json)
+                    all_ocr_raw_results.append({
+                        "page": page_num,
+                        "ocr_result": raw_result
+                    })
+            del ocr_pages
+            total_extraction_time += (time.perf_counter_ns() - extraction_start) / 1e9
+
+            logger.info(f"Worker {self.worker_id}: PDF conversion waited {convert_time:.2f}s for {num_pages} pages")
+
+            total_processing_time = (time.perf_counter_ns() - ocr_start) / 1e9
+            num_tables = sum(len(page_data['tables']) for page_data in all_pages_data)
+            logger.info(f"Worker {self.worker_id}: Total processing took {total_processing_time:.2f}s (OCR: {total_ocr_time:.2f}s, Extraction: {total_extraction_time:.2f}s) - {num_tables} tables")
+
+            # Timing written into both outputs. They are generated and uploaded once, so their own
+            # output generation and upload times are not in them: see the log line and processing_time_ms
             timing_info = {
                 'download': f"{download_time:.2f}",
                 'conversion': f"{convert_time:.2f}",
                 'ocr': f"{total_ocr_time:.2f}",
                 'extraction': f"{total_extraction_time:.2f}",
                 'total_processing': f"{total_processing_time:.2f}",
-                'output_generation': 'pending',
-                'upload': 'pending',
-                'total': 'pending'
+                'total': f"{(time.perf_counter_ns() - start_time) / 1e9:.2f}"
             }
 
-            # Generate production output with initial timing
-            output_gen_start = datetime.now()
-            txt_filename = self.save_raw_text_output(siren, all_pages_data, num_pages, timing_info)
-            output_gen_time = (datetime.now() - output_gen_start).total_seconds()
-            timing_info['output_generation'] = f"{output_gen_time:.2f}"
+            # Generate production output
+            output_gen_start = time.perf_counter_ns()
+            txt_filename, text_length = self.save_raw_text_output(siren, all_pages_data, num_pages, timing_info)
+            output_gen_time = (time.perf_counter_ns() - output_gen_start) / 1e9
 
             # Prepare S3 keys for both text and JSON outputs
             text_output_key = f"structured_output/{siren[:3]}/{siren}.txt"
             json_output_key = f"structured_output/{siren[:3]}/{siren}_raw_ocr.json"
-            text_s3_url = f"https://{Config.S3_BUCKET}.s3.{Config.S3_REGION}.amazonaws.com/{text_output_key}"
-            json_s3_url = f"https://{Config.S3_BUCKET}.s3.{Config.S3_REGION}.amazonaws.com/{json_output_key}"
 
             try:
-                # First, update the local file with output generation time
-                timing_info['output_generation'] = f"{output_gen_time:.2f}"
-                self.update_timing_in_file(txt_filename, timing_info)
-
-                # Read the updated file for upload
-                with open(txt_filename, 'r', encoding='utf-8') as f:
-                    txt_content = f.read()
-
-                # Upload both text and JSON files
-                upload_start = datetime.now()
-
-                # Upload text file
-                text_uploaded = self.s3.upload_text(txt_content, text_output_key)
+                # Upload both text and JSON files; the text file is streamed from disk in the
+                # background while the JSON is serialized and uploaded
+                upload_start = time.perf_counter_ns()
+                text_upload = self.upload_pool.submit(self.s3.upload_file, txt_filename, text_output_key)
 
                 # Create JSON with raw OCR data
                 raw_ocr_data = {
@@ -173,32 +388,18 @@ class LightweightOCRWorker:
                     "raw_ocr_results": all_ocr_raw_results  # Raw OCR results only
                 }
 
-                json_content = json.dumps(raw_ocr_data, indent=2, ensure_ascii=False)
-                json_uploaded = self.s3.upload_text(json_content, json_output_key)
+                json_content = self.dumps_json(raw_ocr_data)
+                json_uploaded = self.s3.upload_json(json_content, json_output_key)
+                text_uploaded = text_upload.result()
 
                 if text_uploaded and json_uploaded:
-                    upload_time = (datetime.now() - upload_start).total_seconds()
-                    total_time = (datetime.now() - start_time).total_seconds()
-
-                    # Final timing info
-                    timing_info['upload'] = f"{upload_time:.2f}"
-                    timing_info['total'] = f"{total_time:.2f}"
-
-                    # Update text file with final timing
-                    self.update_timing_in_file(txt_filename, timing_info)
-                    with open(txt_filename, 'r', encoding='utf-8') as f:
-                        final_txt_content = f.read()
-                    self.s3.upload_text(final_txt_content, text_output_key)
-
-                    # Update JSON with final timing
-                    raw_ocr_data['timing_info'] = timing_info
-                    json_content = json.dumps(raw_ocr_data, indent=2, ensure_ascii=False)
-                    self.s3.upload_text(json_content, json_output_key)
+                    upload_time = (time.perf_counter_ns() - upload_start) / 1e9
+                    total_time = (time.perf_counter_ns() - start_time) / 1e9
 
                     processing_time_ms = int(total_time * 1000)
-                    # Update database with text URL in ocr_s3_path and JSON URL in ocr_text_file_path
-                    self.db.mark_completed(doc['id'], text_s3_url, json_s3_url, processing_time_ms, num_pages, len(final_txt_content))
-                    logger.info(f"Worker {self.worker_id}: Completed {siren} - {num_pages} pages - Text in ocr_s3_path, JSON in ocr_text_file_path - Total: {total_time:.2f}s (Download: {download_time:.2f}s, Convert: {convert_time:.2f}s, OCR: {total_ocr_time:.2f}s, Extract: {total_extraction_time:.2f}s, Upload: {upload_time:.2f}s)")
+                    # Update database with text key in ocr_s3_path and JSON key in ocr_text_file_path (see s3_url)
+                    self.db.mark_completed(doc['id'], text_output_key, json_output_key, processing_time_ms, num_pages, text_length)
+                    logger.info(f"Worker {self.worker_id}: Completed {siren} - {num_pages} pages - Text in ocr_s3_path, JSON in ocr_text_file_path - Total: {total_time:.2f}s (Download: {download_time:.2f}s, Convert: {convert_time:.2f}s, OCR: {total_ocr_time:.2f}s, Extract: {total_extraction_time:.2f}s, Output: {output_gen_time:.2f}s, Upload: {upload_time:.2f}s)")
                 else:
                     self.db.mark_failed(doc['id'], "Failed to upload JSON file")
             except Exception as e:
@@ -209,175 +410,277 @@ class LightweightOCRWorker:
             # Clean up
             if os.path.exists(pdf_path):
                 os.unlink(pdf_path)
+            # Page images and OCR buffers of this document are freed by now; without a trim glibc
+            # keeps the memory in its arenas and the worker sits at its peak RSS while idle
+            release_free_memory()
+
+    def submit_ocr(self, image, page_num, pdf_path):
+        """Start OCR of a rendered page; returns a future (already resolved when OCR runs on this thread)"""
+        if self.ocr_pool is None:
+            future = Future()
+            try:
+                future.set_result(self.process_page(image, page_num, pdf_path))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.ocr_pool.submit(self.process_page, image, page_num, pdf_path)
+
+    def process_page(self, image, page_num, pdf_path):
+        """OCR one rendered page, re-rendering it at PDF_RETRY_DPI when recognition is poor"""
+        ocr_start = time.perf_counter_ns()
+        page_text, blocks, raw_result = self.ocr_page(image, page_num, Config.PDF_DPI)
+        if self.needs_rerender(blocks):
+            # Text too small for the default DPI: OCR the page again at a higher resolution
+            image = self.render_pages(pdf_path, page_num, page_num, dpi=Config.PDF_RETRY_DPI)[0]
+            page_text, blocks, raw_result = self.ocr_page(image, page_num, Config.PDF_RETRY_DPI)
+        return page_text, blocks, raw_result, (time.perf_counter_ns() - ocr_start) / 1e9
+
+    def render_into(self, pdf_path, num_pages, render_q, stop):
+        """
+        Render thread: rasterize the PDF RENDER_CHUNK_PAGES pages at a time and queue the page
+        images in order, then None as end-of-stream marker (an exception instead if rendering fails
+        or returns fewer pages than pdfinfo reported). Returns early once stop is set.
+        """
+        def put(item):
+            # Block while the OCR stage is behind, but give up when the document is abandoned
+            while not stop.is_set():
+                try:
+                    render_q.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
 
-    def process_batch(self, images, batch_start_idx):
-        """Process a batch of images"""
-        batch_results = []
-        batch_ocr_time = 0
-        batch_extraction_time = 0
-
-        for i, image in enumerate(images):
-            page_num = batch_start_idx + i + 1
-
-            # Save image temporarily
-            tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-            image.convert('L').save(tmp_file.name, 'JPEG', quality=95)
-            tmp_file.close()
+        try:
+            for first_page in range(1, num_pages + 1, RENDER_CHUNK_PAGES):
+                last_page = min(first_page + RENDER_CHUNK_PAGES - 1, num_pages)
+                images = self.render_pages(pdf_path, first_page, last_page)
+                # Damaged filings can render fewer pages than pdfinfo counts
+                if len(images) != last_page - first_page + 1:
+                    raise RuntimeError(f"Rendered {len(images)} images for pages {first_page}-{last_page} of {num_pages}")
+                for image in images:
+                    if not put(image):
+                        return
+                del images
+            put(None)
+        except Exception as e:
+            put(e)
 
+    def next_rendered_page(self, render_q, renderer):
+        """Next item of the render queue; fails instead of waiting forever if the render thread died"""
+        while True:
             try:
-                # Run OCR
-                ocr_start = datetime.now()
-                ocr_result = self.ocr.ocr(tmp_file.name)
-                ocr_end = datetime.now()
-                page_ocr_time = (ocr_end - ocr_start).total_seconds()
-                batch_ocr_time += page_ocr_time
-
-                # Parse result
-                page_text = []
-                text_blocks = []
-                raw_result = None
-
-                if ocr_result and len(ocr_result) > 0:
-                    result = ocr_result[0]
-                    raw_result = result  # Store for debug file
-
-                    # Extract text based on format
-                    if 'rec_texts' in result:
-                        # New format
-                        texts = result['rec_texts']
-                        boxes = result.get('dt_polys', [])
-                        scores = result.get('rec_scores', [])
-
-                        for idx, text in enumerate(texts):
+                return render_q.get(timeout=1)
+            except queue.Empty:
+                if not renderer.is_alive() and render_q.empty():
+                    raise RuntimeError("Render thread exited without queuing every page")
+
+    def table_cell_texts(self, tables):
+        """Set of the (stripped) cell texts of a page's extracted tables, as reported by the extractor"""
+        return frozenset().union(*(table['cell_texts'] for table in tables))
+
+    def warm_up(self):
+        """
+        Run det and rec once on a synthetic page, so the first document does not pay for
+        oneDNN primitive creation and kernel selection on its first pages
+        """
+        page = np.full((640, 640), 255, dtype=np.uint8)
+        page[300:330, 100:540:12] = 0  # A row of dark glyph-sized marks for the detector to find
+        start = time.perf_counter_ns()
+        for engine in list(self.ocr_engines.queue):
+            engine.ocr(page, cls=False)
+        logger.info(f"Worker {self.worker_id}: OCR warm-up took {(time.perf_counter_ns() - start) / 1e9:.2f}s")
+
+    def ocr_page(self, image, page_num, dpi):
+        """
+        OCR page page_num, rendered at dpi; returns (page_text, blocks, raw_result).
+        blocks holds the text blocks as parallel columns: 'texts' (list), 'boxes'
+        ((n, 4, 2) float32 corners) and 'scores' ((n,) float32 recognition scores).
+        Boxes, in blocks and raw_result alike, are in REFERENCE_DPI pixels whatever the render DPI,
+        so table extraction thresholds and the JSON coordinates are the same for every page.
+        """
+        # Run OCR on the page in memory (no temp file). Pages are rendered 8-bit gray,
+        # PaddleOCR expands 2-D arrays to 3 channels itself; cls=False as the angle classifier is disabled.
+        # Blank pages (covers, separators) skip the models entirely
+        pixels = np.asarray(image)
+        ocr_result = None
+        if self.is_blank(pixels):
+            logger.debug(f"Worker {self.worker_id}: Page {page_num} is blank, skipping OCR")
+        else:
+            engine = self.ocr_engines.get()
+            try:
+                ocr_result = engine.ocr(pixels, cls=False)
+            finally:
+                self.ocr_engines.put(engine)
+
+        # Parse result
+        page_text = []
+        texts = []
+        boxes = []
+        scores = []
+        raw_result = None
+
+        # PaddleOCR returns [None] when nothing was detected on the page
+        if ocr_result and ocr_result[0]:
+            result = ocr_result[0]
+            raw_result = self.raw_result_at_reference(result, dpi)  # Store for debug file and JSON
+
+            # Extract text based on format
+            if 'rec_texts' in result:
+                # New format
+                rec_texts = result['rec_texts']
+                dt_polys = result.get('dt_polys', [])
+                rec_scores = result.get('rec_scores', [])
+
+                for idx, text in enumerate(rec_texts):
+                    if text and text.strip():
+                        page_text.append(text)
+                        if idx < len(dt_polys):
+                            texts.append(text)
+                            boxes.append(dt_polys[idx])
+                            scores.append(rec_scores[idx] if idx < len(rec_scores) else 0.0)
+            else:
+                # Old format
+                for item in result:
+                    if isinstance(item, (list, tuple)) and len(item) >= 2:
+                        box, text_data = item[0], item[1]
+                        if isinstance(text_data, (list, tuple)) and len(text_data) >= 2:
+                            text, confidence = text_data[0], text_data[1]
                             if text and text.strip():
                                 page_text.append(text)
-                                if idx < len(boxes):
-                                    text_blocks.append({
-                                        'text': text,
-                                        'bbox': boxes[idx].tolist() if hasattr(boxes[idx], 'tolist') else boxes[idx],
-                                        'confidence': scores[idx] if idx < len(scores) else 0.0
-                                    })
-                    else:
-                        # Old format
-                        for item in result:
-                            if isinstance(item, (list, tuple)) and len(item) >= 2:
-                                box, text_data = item[0], item[1]
-                                if isinstance(text_data, (list, tuple)) and len(text_data) >= 2:
-                                    text, confidence = text_data[0], text_data[1]
-                                    if text and text.strip():
-                                        page_text.append(text)
-                                        text_blocks.append({
-                                            'text': text,
-                                            'bbox': box,
-                                            'confidence': confidence
-                                        })
-
-                # Table extraction - works with PaddleOCR v2 format conversion
-                extraction_start = datetime.now()
-                tables = self.table_extractor.extract_tables_from_page(text_blocks, page_num)
-                extraction_end = datetime.now()
-                page_extraction_time = (extraction_end - extraction_start).total_seconds()
-                batch_extraction_time += page_extraction_time
-
-                page_data = {
-                    "page": page_num,
-                    "text": " ".join(page_text),
-                    "text_blocks": text_blocks,
-                    "tables": tables  # Add extracted tables
-                }
-
-                batch_results.append((page_data, raw_result))
-
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_file.name):
-                    os.unlink(tmp_file.name)
+                                texts.append(text)
+                                boxes.append(box)
+                                scores.append(confidence)
+
+        blocks = {
+            'texts': texts,
+            'boxes': scale_to_reference(bbox_array(boxes, dtype=np.float32), dpi),
+            'scores': np.asarray(scores, dtype=np.float32)
+        }
+        return page_text, blocks, raw_result
+
+    def raw_result_at_reference(self, result, dpi):
+        """Copy of a raw PaddleOCR page result with its polygons scaled to REFERENCE_DPI pixels"""
+        def scale(poly):
+            return scale_to_reference(np.asarray(poly, dtype=np.float32), dpi)
+
+        if dpi == REFERENCE_DPI:
+            return result
+        if 'rec_texts' in result:
+            return {**result, 'dt_polys': [scale(poly) for poly in result.get('dt_polys', [])]}
+        return [[scale(item[0]), *item[1:]] if isinstance(item, (list, tuple)) and len(item) >= 2 else item
+                for item in result]
+
+    @staticmethod
+    def is_blank(pixels):
+        """Whether a grayscale page has at most BLANK_PAGE_MAX_INK of dark pixels"""
+        if Config.BLANK_PAGE_MAX_INK <= 0:
+            return False
+        # Every pixel is counted: a subsampled grid can miss the thin strokes of a lone page number
+        return np.count_nonzero(pixels < 128) <= Config.BLANK_PAGE_MAX_INK * pixels.size
+
+    def needs_rerender(self, blocks):
+        """Whether the page was recognized with a median confidence low enough to retry at PDF_RETRY_DPI"""
+        if not len(blocks['scores']) or Config.PDF_RETRY_DPI <= Config.PDF_DPI:
+            return False
+        return np.median(blocks['scores']) < Config.PDF_RETRY_MIN_SCORE
+
+    def render_pages(self, pdf_path, first_page, last_page, dpi=None):
+        """Rasterize pages first_page..last_page (1-based, inclusive) of the PDF, at PDF_DPI by default"""
+        # pdftoppm writes raw 8-bit gray PGM to its stdout pipe: no temp files and no lossy encoding
+        # (pdf2image runs pdftocairo, and any non-PPM format, through a temp directory instead)
+        return convert_from_path(
+            pdf_path,
+            dpi=dpi or Config.PDF_DPI,
+            thread_count=4,
+            first_page=first_page,
+            last_page=last_page,
+            grayscale=True
+        )
 
-        return batch_results, batch_ocr_time, batch_extraction_time
+    def submit_extraction(self, blocks, page_num):
+        """Start table extraction for a page; returns a future (already resolved when running in-process)"""
+        if self.extraction_pool is None:
+            future = Future()
+            page = PageIndex(blocks['texts'], blocks['boxes'])
+            future.set_result(self.table_extractor.extract_tables_from_page(page, page_num))
+            return future
+        return self.extraction_pool.submit(extract_page_tables, (blocks['texts'], blocks['boxes'], page_num))
 
     def save_raw_text_output(self, siren, all_pages_data, num_pages, timing_info=None):
-        """Generate OCR output for ALL pages - text and tables only"""
+        """Generate OCR output for ALL pages - text and tables only; returns (filename, length in characters)"""
         try:
             filename = f'/tmp/ocr_{siren}.txt'
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"=== RAW OCR OUTPUT FOR {siren} ===\n")
-                f.write(f"Total Pages: {num_pages}\n")
-
-                # Add timing breakdown if available
-                if timing_info:
-                    f.write("\n=== TIMING BREAKDOWN ===\n")
-                    f.write(f"1. PDF Download from S3: {timing_info.get('download', 'N/A')} seconds\n")
-                    f.write(f"2. PDF to Image Conversion: {timing_info.get('conversion', 'N/A')} seconds\n")
-                    f.write(f"3. OCR Processing (text recognition): {timing_info.get('ocr', 'N/A')} seconds\n")
-                    f.write(f"4. Table Extraction (structure analysis): {timing_info.get('extraction', 'N/A')} seconds\n")
-                    f.write(f"5. Output File Generation: {timing_info.get('output_generation', 'N/A')} seconds\n")
-                    f.write(f"6. S3 Upload: {timing_info.get('upload', 'N/A')} seconds\n")
-                    f.write(f"\n--- SUBTOTALS ---\n")
-                    f.write(f"Total Processing (OCR + Extraction): {timing_info.get('total_processing', 'N/A')} seconds\n")
-                    f.write(f"Total Time (entire pipeline): {timing_info.get('total', 'N/A')} seconds\n")
-
-                f.write("="*80 + "\n\n")
-
-                # Write all pages' data
-                for page_data in all_pages_data:
-                    page_num = page_data.get('page', '?')
-                    f.write(f"\n{'='*40} PAGE {page_num} {'='*40}\n\n")
-
-                    # Write the full combined text first
-                    page_text = page_data.get('text', '')
-                    f.write("=== FULL TEXT ===\n")
-                    f.write(page_text)
-                    f.write("\n\n")
-
-                    # Extract non-table text
-                    text_blocks = page_data.get('text_blocks', [])
-                    tables = page_data.get('tables', [])
-
-                    # Get text that's in tables (to exclude from non-table text)
-                    table_text = set()
-                    if tables:
-                        for table in tables:
-                            # Parse HTML to extract text from tables
-                            html = table.get('html_structure', '')
-                            # Simple extraction - find text between tags
-                            import re
-                            table_contents = re.findall(r'>([^<]+)<', html)
-                            for content in table_contents:
-                                if content.strip():
-                                    table_text.add(content.strip())
-
-                    # Write non-table text
-                    f.write("=== TEXT OUTSIDE TABLES ===\n")
-                    non_table_text = []
-                    for block in text_blocks:
-                        block_text = block.get('text', '').strip()
-                        if block_text and block_text not in table_text:
-                            non_table_text.append(block_text)
-
-                    if non_table_text:
-                        f.write("\n".join(non_table_text))
-                    else:
-                        f.write("(All text is contained in tables)")
-                    f.write("\n\n")
-
-                    # Write extracted tables if any
-                    if tables:
-                        f.write(f"=== EXTRACTED TABLES (Page {page_num}) ===\n")
-                        for i, table in enumerate(tables, 1):
-                            f.write(f"\nTable {i}:\n")
-                            f.write(table.get('html_structure', '<no table>'))
-                            f.write("\n")
-                    else:
-                        f.write("=== NO TABLES DETECTED ===\n")
-
-                f.write("\n" + "="*80 + "\n")
-                f.write("=== END OF DOCUMENT ===\n")
+            # Assemble the whole file in memory and write it with a single encode and write call
+            parts = []
+            write = parts.append
+            write(f"=== RAW OCR OUTPUT FOR {siren} ===\n")
+            write(f"Total Pages: {num_pages}\n")
+
+            # Add timing breakdown if available
+            if timing_info:
+                write("\n=== TIMING BREAKDOWN ===\n")
+                write(f"1. PDF Download from S3: {timing_info.get('download', 'N/A')} seconds\n")
+                write(f"2. PDF to Image Conversion: {timing_info.get('conversion', 'N/A')} seconds\n")
+                write(f"3. OCR Processing (text recognition): {timing_info.get('ocr', 'N/A')} seconds\n")
+                write(f"4. Table Extraction (structure analysis): {timing_info.get('extraction', 'N/A')} seconds\n")
+                write(f"\n--- SUBTOTALS ---\n")
+                write(f"Total Processing (OCR + Extraction): {timing_info.get('total_processing', 'N/A')} seconds\n")
+                write(f"Total Time (before output): {timing_info.get('total', 'N/A')} seconds\n")
+
+            write("="*80 + "\n\n")
+
+            # Write all pages' data
+            for page_data in all_pages_data:
+                page_num = page_data.get('page', '?')
+                write(f"\n{'='*40} PAGE {page_num} {'='*40}\n\n")
+
+                # Write the full combined text first
+                page_text = page_data.get('text', '')
+                write("=== FULL TEXT ===\n")
+                write(page_text)
+                write("\n\n")
+
+                # Extract non-table text
+                texts = page_data.get('texts', [])
+                tables = page_data.get('tables', [])
+
+                # Text that's in tables (to exclude from non-table text), collected with the page
+                table_text = page_data.get('table_text', frozenset())
+
+                # Write non-table text
+                write("=== TEXT OUTSIDE TABLES ===\n")
+                # texts only holds non-blank blocks (see ocr_page), so each is stripped once and looked up once
+                non_table_text = [text for text in map(str.strip, texts) if text not in table_text]
+
+                if non_table_text:
+                    write("\n".join(non_table_text))
+                else:
+                    write("(All text is contained in tables)")
+                write("\n\n")
+
+                # Write extracted tables if any
+                if tables:
+                    write(f"=== EXTRACTED TABLES (Page {page_num}) ===\n")
+                    for i, table in enumerate(tables, 1):
+                        write(f"\nTable {i}:\n")
+                        write(table.get('html_structure', '<no table>'))
+                        write("\n")
+                else:
+                    write("=== NO TABLES DETECTED ===\n")
+
+            write("\n" + "="*80 + "\n")
+            write("=== END OF DOCUMENT ===\n")
+
+            text = ''.join(parts)
+            with open(filename, 'wb') as f:
+                f.write(text.encode('utf-8'))
 
             logger.info(f"Worker {self.worker_id}: Raw OCR output saved to {filename}")
-            return filename
+            return filename, len(text)
         except Exception as e:
             logger.warning(f"Worker {self.worker_id}: Could not save raw output file: {e}")
-            return None
+            return None, 0
 
     def save_debug_file(self, siren, s3_key, num_pages, ocr_results):
         """Save OCR debug file with ALL pages - called ONCE after all processing"""
@@ -386,114 +689,61 @@ class LightweightOCRWorker:
 
         try:
             filename = f'/app/src/ocr_{siren}_all_pages.txt'
-            with open(filename, 'w') as f:
-                # Write header
-                f.write(f"=== COMPLETE OCR RESULTS FOR ALL PAGES ===\n")
-                f.write(f"PDF Source: {s3_key}\n")
-                f.write(f"S3 URL: https://{Config.S3_BUCKET}.s3.{Config.S3_REGION}.amazonaws.com/{s3_key}\n")
-                f.write(f"SIREN: {siren}\n")
-                f.write(f"Total Pages: {num_pages}\n")
-                f.write(f"Actual Pages Processed: {len(ocr_results)}\n")
-                f.write("="*80 + "\n\n")
-
-                # Write each page
-                for page_num, result in ocr_results:
-                    f.write(f"\n{'='*80}\n")
-                    f.write(f"=== PAGE {page_num} of {num_pages} ===\n")
-
-                    if result and 'rec_texts' in result:
-                        texts = result['rec_texts']
-                        f.write(f"Text blocks detected: {len(texts)}\n")
-                        f.write(f"{'='*80}\n\n")
-
-                        # Text content
-                        f.write("=== TEXT CONTENT ===\n")
-                        f.write(f"Number of text blocks: {len(texts)}\n\n")
-                        for i, text in enumerate(texts[:100], 1):  # Limit to first 100
-                            f.write(f"{i:3d}. {text}\n")
-                        if len(texts) > 100:
-                            f.write(f"... and {len(texts)-100} more text blocks\n")
-
-                        # Confidence summary
-                        if 'rec_scores' in result:
-                            scores = result['rec_scores']
-                            if scores:
-                                f.write(f"\n=== CONFIDENCE ===\n")
-                                f.write(f"Average: {sum(scores)/len(scores):.4f}\n")
-                                f.write(f"Min: {min(scores):.4f}, Max: {max(scores):.4f}\n")
-                    else:
-                        f.write("No OCR results for this page\n")
-
-                    f.write("\n")
+            # Built in memory and written once, like save_raw_text_output
+            parts = []
+            write = parts.append
+            # Write header
+            write(f"=== COMPLETE OCR RESULTS FOR ALL PAGES ===\n")
+            write(f"PDF Source: {s3_key}\n")
+            write(f"S3 URL: {s3_url(s3_key)}\n")
+            write(f"SIREN: {siren}\n")
+            write(f"Total Pages: {num_pages}\n")
+            write(f"Actual Pages Processed: {len(ocr_results)}\n")
+            write("="*80 + "\n\n")
+
+            # Write each page
+            for page_num, result in ocr_results:
+                write(f"\n{'='*80}\n")
+                write(f"=== PAGE {page_num} of {num_pages} ===\n")
+
+                if result and 'rec_texts' in result:
+                    texts = result['rec_texts']
+                    write(f"Text blocks detected: {len(texts)}\n")
+                    write(f"{'='*80}\n\n")
+
+                    # Text content
+                    write("=== TEXT CONTENT ===\n")
+                    write(f"Number of text blocks: {len(texts)}\n\n")
+                    for i, text in enumerate(texts[:100], 1):  # Limit to first 100
+                        write(f"{i:3d}. {text}\n")
+                    if len(texts) > 100:
+                        write(f"... and {len(texts)-100} more text blocks\n")
+
+                    # Confidence summary
+                    if 'rec_scores' in result:
+                        scores = result['rec_scores']
+                        if scores:
+                            write(f"\n=== CONFIDENCE ===\n")
+                            write(f"Average: {sum(scores)/len(scores):.4f}\n")
+                            write(f"Min: {min(scores):.4f}, Max: {max(scores):.4f}\n")
+                else:
+                    write("No OCR results for this page\n")
+
+                write("\n")
+
+            with open(filename, 'wb') as f:
+                f.write(''.join(parts).encode('utf-8'))
 
             logger.info(f"Worker {self.worker_id}: Debug file saved to {filename}")
         except Exception as e:
             logger.warning(f"Worker {self.worker_id}: Could not save debug file: {e}")
 
-    def _make_json_serializable(self, obj):
-        """Convert numpy arrays and other non-serializable objects to JSON-serializable format"""
-        import numpy as np
-
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, dict):
-            return {k: self._make_json_serializable(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._make_json_serializable(item) for item in obj]
-        elif isinstance(obj, tuple):
-            return [self._make_json_serializable(item) for item in obj]
-        else:
-            return obj
-
-    def update_timing_in_file(self, filename, timing_info):
-        """Update the timing section in an already written file"""
-        try:
-            # Read the existing file
-            with open(filename, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # Find and replace the timing section
-            timing_section_start = -1
-            timing_section_end = -1
-            for i, line in enumerate(lines):
-                if '=== TIMING BREAKDOWN ===' in line:
-                    timing_section_start = i
-                elif timing_section_start > -1 and '===' in line and i > timing_section_start:
-                    timing_section_end = i
-                    break
-
-            if timing_section_start > -1:
-                # Create new timing section
-                new_timing_lines = [
-                    "\n=== TIMING BREAKDOWN ===\n",
-                    f"1. PDF Download from S3: {timing_info.get('download', 'N/A')} seconds\n",
-                    f"2. PDF to Image Conversion: {timing_info.get('conversion', 'N/A')} seconds\n",
-                    f"3. OCR Processing (text recognition): {timing_info.get('ocr', 'N/A')} seconds\n",
-                    f"4. Table Extraction (structure analysis): {timing_info.get('extraction', 'N/A')} seconds\n",
-                    f"5. Output File Generation: {timing_info.get('output_generation', 'N/A')} seconds\n",
-                    f"6. S3 Upload: {timing_info.get('upload', 'N/A')} seconds\n",
-                    f"\n--- SUBTOTALS ---\n",
-                    f"Total Processing (OCR + Extraction): {timing_info.get('total_processing', 'N/A')} seconds\n",
-                    f"Total Time (entire pipeline): {timing_info.get('total', 'N/A')} seconds\n",
-                    "\n"
-                ]
-
-                # Replace the old timing section
-                if timing_section_end > -1:
-                    lines[timing_section_start:timing_section_end] = new_timing_lines
-                else:
-                    # If we didn't find the end, just replace from start to next section
-                    lines[timing_section_start:timing_section_start+10] = new_timing_lines
-
-                # Write back to file
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.writelines(lines)
-        except Exception as e:
-            logger.warning(f"Could not update timing in file: {e}")
+    def dumps_json(self, data):
+        """Serialize data, which may hold numpy arrays and scalars, to indented UTF-8 JSON bytes"""
+        if orjson is not None:
+            # orjson serializes numpy natively, no Python-level walk of the OCR results
+            return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_INDENT_2)
+        return json.dumps(data, cls=_NumpyJSONEncoder, indent=2, ensure_ascii=False).encode('utf-8')
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
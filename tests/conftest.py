@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the service modules as src.*, like the worker does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
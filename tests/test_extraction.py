@@ -0,0 +1,53 @@
+"""Table extraction does not depend on the resolution pages are rendered at."""
+
+import numpy as np
+import pytest
+
+from src.extraction import REFERENCE_DPI, TableExtractor, PageIndex, bbox_array, scale_to_reference
+
+
+def _balance_sheet_page():
+    """Text blocks of a small balance sheet, in REFERENCE_DPI pixels"""
+    texts, boxes = [], []
+
+    def add(x, y, text):
+        w = 8 * len(text)
+        texts.append(text)
+        boxes.append([[x, y], [x + w, y], [x + w, y + 12], [x, y + 12]])
+
+    add(60, 40, "BILAN ACTIF")
+    add(500, 100, "Exercice N")
+    add(700, 100, "Exercice N-1")
+    rows = [("Capital souscrit", "10 000", "10 000"), ("Stocks", "25 430", "21 980"),
+            ("Créances clients", "112 305", "98 410"), ("Disponibilités", "48 122", "51 007"),
+            ("Total actif", "195 857", "181 397")]
+    # Rows 20px apart with the amounts set 8px below their label: one row per line at REFERENCE_DPI
+    # only, as _group_into_rows splits rows on 10px gaps
+    for i, (label, current, previous) in enumerate(rows):
+        y = 130 + 20 * i
+        add(60, y, label)
+        add(510, y + 8, current)
+        add(710, y + 8, previous)
+    return texts, bbox_array(boxes, dtype=np.float32)
+
+
+def _tables(texts, boxes):
+    return TableExtractor().extract_tables_from_page(PageIndex(texts, boxes), 1)
+
+
+@pytest.mark.parametrize("dpi", [120, 200])
+def test_tables_unchanged_across_render_dpi(dpi):
+    texts, boxes = _balance_sheet_page()
+    expected = _tables(texts, boxes)
+    assert expected
+
+    rendered = boxes * np.float32(dpi / REFERENCE_DPI)  # The same page, rasterized at dpi
+    assert _tables(texts, rendered) != expected
+    assert _tables(texts, scale_to_reference(rendered, dpi)) == expected
+
+
+def test_scale_to_reference_keeps_dtype():
+    boxes = np.ones((3, 4, 2), dtype=np.float32)
+    scaled = scale_to_reference(boxes, 2 * REFERENCE_DPI)
+    assert scaled.dtype == np.float32
+    assert np.allclose(scaled, 0.5)
@@ -0,0 +1,39 @@
+"""Blank page detection keeps sparse but non-empty pages."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("paddleocr")
+
+from src.worker_lightweight import LightweightOCRWorker
+
+# A4 at the default 120 DPI
+PAGE_SHAPE = (1403, 992)
+
+
+def _page():
+    return np.full(PAGE_SHAPE, 255, dtype=np.uint8)
+
+
+def test_white_page_is_blank():
+    page = _page()
+    page[700, 500] = 0  # A speck of scanner noise
+    assert LightweightOCRWorker.is_blank(page)
+
+
+def test_lone_page_number_is_not_blank():
+    page = _page()
+    page[1340:1352, 495:497] = 0  # "1" at the page foot: a 2px wide, 12px tall stroke
+    assert not LightweightOCRWorker.is_blank(page)
+
+
+def test_short_word_is_not_blank():
+    page = _page()
+    # "Néant": five 8x12 glyphs drawn as 1px outlines, 180 dark pixels in all
+    for i in range(5):
+        x = 400 + 10 * i
+        page[600, x:x + 8] = 0
+        page[611, x:x + 8] = 0
+        page[600:612, x] = 0
+        page[600:612, x + 7] = 0
+    assert not LightweightOCRWorker.is_blank(page)